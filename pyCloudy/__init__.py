@@ -22,11 +22,13 @@ log_.level=0
 config.db_connector = 'PyMySQL'
 log_.level=2
 
-from .c1d.cloudy_model import CloudyModel, load_models, CloudyInput, print_make_file, run_cloudy
+from .c1d.cloudy_model import CloudyModel, load_models, iter_models, CloudyInput, print_make_file, run_cloudy
+from .c1d.model_set import ModelSet, ZoneSet, GridWatcher, ContinuumCube
 from .c3d.model_3d import CubCoord, C3D
 from .utils.misc import sextract, save, restore
 from .utils.physics import CST
 from .utils.red_corr import RedCorr
+from .utils.filters import FilterBank
 from .utils import astro
 from .db.MdB import MdB
 
@@ -2,6 +2,6 @@
 pyCloudy.C1D.__init__ file
 """
 
-__all__ = ['CloudyModel', 'load_models', 'CloudyInput', 'print_make_file', 'run_cloudy']
+__all__ = ['CloudyModel', 'load_models', 'iter_models', 'CloudyInput', 'print_make_file', 'run_cloudy', 'ModelSet', 'ZoneSet', 'GridWatcher', 'ContinuumCube']
 #from cloudy_model import CloudyModel
 
@@ -6,9 +6,12 @@ import subprocess
 import random
 import time
 import re
+import json
+from collections import deque
 from ..utils.init import LIST_ELEM, LIST_ALL_ELEM, SYM2ELEM
-from ..utils.misc import sextract, cloudy2pyneb, convert_c13_c17, convert_c17_c13, mytrapz
-from ..utils.physics import ATOMIC_MASS
+from ..utils.misc import sextract, cloudy2pyneb, convert_labels, mytrapz, read_cloudy_tab, structured_to_2d, \
+    read_cloudy_names, validate_names, quiet_divide
+from ..utils.physics import ATOMIC_MASS, CST
 if pc.config.INSTALLED['PyNeb']:
     import pyneb
 if pc.config.INSTALLED['scipy']:
@@ -102,7 +105,8 @@ class CloudyModel(object):
                  list_elem = LIST_ELEM, distance = None, line_is_log = False,
                  emis_is_log = True,
                  ionic_str_key = 'ele_',
-                 cloudy_version_major=None):
+                 cloudy_version_major=None, use_cache=False, lazy=False, read_out_until=None, use_mmap=False,
+                 dtype=np.float64, emis_labels=None, ions=None):
         """
         param:
             - model_name [str] The name of the model to be read.
@@ -116,6 +120,30 @@ class CloudyModel(object):
             - line_is_log [boolean] if True, intensities in .lin file_ are in log, if False are in linear
             - emis_is_log [boolean] if True, intensities in .emis file_ are in log, if False are in linear
             - cloudy_version_major [int]: needed if the Cloudy version is not given in the first lines of the output
+            - use_cache [boolean] if True, the parsed outputs are stored in the model_name.cache directory and
+                read from it the next time the model is opened. The cache is rebuilt when the Cloudy files change.
+            - lazy [boolean] if True, only the .out file is read here. The extensions selected by the read_* parameters
+                are read the first time one of the attributes they define is used (e.g. te_full, emis_full,
+                ionic_full['O'], _res['cont']).
+            - read_out_until [str] if set, the reading of the .out file stops once the corresponding item of self.out
+                is found (e.g. '###First' stops at the first zone, after the input, abundances and SED are read).
+                The items found later in the file (warnings, 'Cloudy ends', etc) are then not available.
+            - use_mmap [boolean] if True, emis_full, ionic_full and the continuum are read-only arrays memory-mapped
+                from .npy files of the model_name.cache directory (the same as use_cache, these arrays being
+                stored instead of the parsed .emis, .ele_X and .cont files). These files are written from
+                the Cloudy outputs the first time, and again when the Cloudy files change. The memory is then
+                shared between processes using the same model, and only the parts of the arrays that are used
+                are read from disk.
+            - dtype [numpy dtype] type of emis_full, ionic_full, the grain arrays and the continua.
+                np.float32 halves the memory used by the model, Cloudy writing only 4 or 5 significant digits.
+                The integrals over the nebula are still computed in float64. Note that values below ~1e-38
+                (e.g. weak emissivities) are then not represented accurately, or set to 0.
+            - emis_labels [list of str] if set, only these emissivities (and Hbeta) are read from the .emis file,
+                the other columns are skipped. The labels can be given as in the Cloudy file or as in
+                emis_labels, for Cloudy 13 or 17.
+            - ions [int or dict] if set, only the first ions ionization stages (0 for the atom) are read
+                from the .ele_X files. A dictionary {'Fe': 5, ...} gives the number for each element,
+                the elements not in the dictionary being completely read.
         """
 
         self.log_ = pc.log_
@@ -130,8 +158,26 @@ class CloudyModel(object):
         self.line_is_log = line_is_log
         self.distance = distance
         self.empty_model = True
-        self._read_stout(emis_is_log=emis_is_log)
-        if self.out_exists and not self.aborted and read_all_ext:
+        self._r_range_cache = None
+        self._cumul_cache = {}
+        self._continuum = None
+        self._use_cache = use_cache
+        self._use_mmap = use_mmap
+        if use_cache or use_mmap:
+            self._cache = _OutputsCache(self.model_name)
+        else:
+            self._cache = None
+        self.dtype = np.dtype(dtype)
+        self._wanted_emis = None if emis_labels is None else tuple(emis_labels)
+        self._wanted_ions = ions
+        self._init_stout(emis_is_log=emis_is_log, read_out_until=read_out_until)
+        if self.out_exists and not self.aborted and read_all_ext and lazy:
+            self._init_all2zero()
+            self._init_lazy(read_rad=read_rad, read_phy=read_phy, read_emis=read_emis, read_grains=read_grains,
+                            read_cont=read_cont, read_heatcool=read_heatcool, read_lin=read_lin, read_opd=read_opd,
+                            read_pressure=read_pressure, read_abunds=read_abunds, read_ovr=read_ovr,
+                            list_elem=list_elem, ionic_str_key=ionic_str_key)
+        elif self.out_exists and not self.aborted and read_all_ext:
             self._init_all2zero()
             if read_rad:
                 self._init_rad()
@@ -140,6 +186,7 @@ class CloudyModel(object):
             for elem in list_elem:
                 self._init_ionic(elem, str_key = ionic_str_key)
             self.liste_elem = list(self.ionic_names.keys())
+            self.n_elements = np.size(self.liste_elem)
             if read_opd:
                 self._init_opd()
             if read_lin:
@@ -158,6 +205,8 @@ class CloudyModel(object):
                 self._init_abunds()
             if read_ovr:
                 self._init_ovr()
+        if self._cache is not None:
+            self._cache.save()
     ##
     # @var distance
     # distance to the object (kpc)
@@ -214,6 +263,111 @@ class CloudyModel(object):
         self.abunds_full = None
         self.pressure_full = None
 
+    def _init_lazy(self, read_rad, read_phy, read_emis, read_grains, read_cont, read_heatcool, read_lin,
+                   read_opd, read_pressure, read_abunds, read_ovr, list_elem, ionic_str_key):
+        """
+        Register the methods reading the outputs, to be called when one of the attributes they define is used.
+        """
+        loaders = []
+        if read_rad:
+            loaders.append(('_init_rad',))
+        if read_phy:
+            loaders.append(('_init_phy',))
+        loaders += [('_init_ionic', elem, ionic_str_key) for elem in list_elem]
+        if read_opd:
+            loaders.append(('_init_opd',))
+        if read_lin:
+            loaders.append(('_init_lin',))
+        if read_emis:
+            loaders.append(('_init_emis',))
+        if read_cont:
+            loaders.append(('_init_cont',))
+        if read_grains:
+            loaders.append(('_init_grains',))
+        if read_heatcool:
+            loaders.append(('_init_heatcool',))
+        if read_pressure:
+            loaders.append(('_init_pressure',))
+        if read_abunds:
+            loaders.append(('_init_abunds',))
+        if read_ovr:
+            loaders.append(('_init_ovr',))
+        self._lazy_loaders = {}
+        self._res = _LazyDict(self)
+        self.ionic_full = _LazyDict(self)
+        self.ionic_names = _LazyDict(self)
+        self.n_ions = _LazyDict(self)
+        for loader in loaders:
+            if loader[0] == '_init_ionic':
+                self._res.pending[ionic_str_key + loader[1]] = loader
+                for lazy_dict in (self.ionic_full, self.ionic_names, self.n_ions):
+                    lazy_dict.pending[loader[1]] = loader
+            else:
+                for name in _LAZY_ATTRS[loader[0]]:
+                    self._lazy_loaders[name] = loader
+                for key in _LAZY_RES[loader[0]]:
+                    self._res.pending[key] = loader
+        if read_rad and self.Phi0 == 0.:
+            self._lazy_loaders['Phi'] = ('_init_rad',)
+            self._lazy_loaders['Phi0'] = ('_init_rad',)
+        for lazy_dict in (self._res, self.ionic_full, self.ionic_names, self.n_ions):
+            lazy_dict.order = list(lazy_dict.pending)
+        self._lazy_loaders['liste_elem'] = ('_init_liste_elem',)
+        self._lazy_loaders['n_elements'] = ('_init_liste_elem',)
+        self._lazy_defaults = {name: self.__dict__.pop(name) for name in self._lazy_loaders if name in self.__dict__}
+
+    def _init_liste_elem(self):
+        for lazy_dict in (self.ionic_full, self.ionic_names, self.n_ions):
+            lazy_dict.load_all()
+        self.liste_elem = list(self.ionic_names.keys())
+        self.n_elements = np.size(self.liste_elem)
+
+    def _lazy_load(self, loader):
+        """
+        Call the method reading the outputs (lazy mode) and unregister all the attributes it defines.
+        """
+        for pending in (self._lazy_loaders, self._res.pending, self.ionic_full.pending,
+                        self.ionic_names.pending, self.n_ions.pending):
+            for key in [key for key, value in pending.items() if value == loader]:
+                del pending[key]
+        self.log_.debug('Lazy call to {0}{1}'.format(loader[0], loader[1:]), calling=self.calling)
+        getattr(self, loader[0])(*loader[1:])
+        # Attributes belonging to another loader must stay unset until their own loader is called
+        for name in self._lazy_loaders:
+            self.__dict__.pop(name, None)
+        if self._cache is not None:
+            self._cache.save()
+
+    def _lazy_load_all(self):
+        while self._lazy_loaders:
+            self._lazy_load(next(iter(self._lazy_loaders.values())))
+        for lazy_dict in (self._res, self.ionic_full, self.ionic_names, self.n_ions):
+            lazy_dict.load_all()
+
+    def __getstate__(self):
+        """
+        In lazy mode, all the outputs are read before the object is pickled or copied.
+        """
+        if self.__dict__.get('_lazy_loaders') is not None:
+            self._lazy_load_all()
+        return self.__dict__
+
+    def __getattr__(self, name):
+        """
+        Only called when the attribute is not found. In lazy mode, read the output defining the attribute.
+        """
+        loaders = self.__dict__.get('_lazy_loaders')
+        if loaders is not None:
+            if name in loaders:
+                self._lazy_load(loaders[name])
+                if name in self.__dict__:
+                    return self.__dict__[name]
+            defaults = self.__dict__['_lazy_defaults']
+            if name in defaults:
+                self.__dict__[name] = defaults.pop(name)
+                return self.__dict__[name]
+        raise AttributeError("'{0}' object has no attribute '{1}'".format(type(self).__name__, name))
+
     def _init_rad(self):
         key = 'rad'
         self._res[key] = self.read_outputs(key)
@@ -244,6 +398,8 @@ class CloudyModel(object):
             self.depth_out_cut = self.depth_out
             self.r_in_cut = self.r_in
             self.r_out_cut = self.r_out
+            self._r_range_cache = None
+            self._cumul_cache = {}
             if self.Phi0 == 0.:
                 self.Phi = self.Q / (4 * np.pi * self.r_in**2)
                 self.Phi0 = self.Phi.sum()
@@ -282,6 +438,8 @@ class CloudyModel(object):
             self.nHff_full = self.nH_full * self.ff_full
             self.H_mass_full = (self.nH_full * self.dv_full * self.ff_full).cumsum() * pc.CST.HMASS / pc.CST.SUN_MASS
             self.__H_mass_cut = self.H_mass_full[-1]
+            self._r_range_cache = None
+            self._cumul_cache = {}
     ##
     # @var ne_full
     # array of electron density, r_range unused [float] (cm^-3)
@@ -315,25 +473,13 @@ class CloudyModel(object):
             lines = self._res[key]
             self.line_labels = np.asarray(lines.dtype.names[1::])
             if self.cloudy_version_major > 13:
-                # We are with c17+ and will create emis_labels_13
+                # We are with c17+ and will create line_labels_13
                 self.line_labels_17 = self.line_labels
-                self.line_labels_13 = []
-                for label in self.line_labels:
-                    try:
-                        self.line_labels_13.append(convert_c17_c13(label))
-                    except:
-                        self.line_labels_13.append('')
-                self.line_labels_13 = np.array(self.line_labels_13, dtype=str)
+                self.line_labels_13 = convert_labels(self.line_labels, from_='c17')
             else:
-                # We are with c13 and will create emis_labels_17
+                # We are with c13 and will create line_labels_17
                 self.line_labels_13 = self.line_labels
-                self.line_labels_17 = []
-                for label in self.line_labels:
-                    try:
-                        self.line_labels_17.append(convert_c13_c17(label))
-                    except:
-                        self.line_labels_17.append('')
-                self.line_labels_17 = np.array(self.line_labels_17, dtype=str)
+                self.line_labels_17 = convert_labels(self.line_labels, from_='c13')
             self.n_lines = np.size(self.line_labels)
             self.log_.message('Number of lines: {0.n_lines:d}'.format(self), calling = self.calling)
             self.lines = np.zeros(self.n_lines)
@@ -341,74 +487,119 @@ class CloudyModel(object):
                 self.lines[i] = trans_line(lines[label])
             self.slines = np.asarray([label for label in self.line_labels if label[-2] != '_'])
             self.rlines = np.asarray([(label[:-2], label) [label[-2] != '_'] for label in self.line_labels])
+            self._set_line_index()
 
     def _init_emis(self):
         key = 'emis'
-        self._res[key] = self.read_outputs(key, case_sensitive='upper') #may need skip_header=1
-        if self._res[key] is not None:
-            if self.emis_is_log:
-                trans_emis = lambda x: pow(10., x)
-            else:
-                trans_emis = lambda x: x
-            emis = self._res[key]
-            self.emis_labels = np.asarray(emis.dtype.names[1::])
-
+        emis_full = None
+        if self._use_mmap:
+            emis_full, labels = self._cache.get_array(key, key, args=(self.emis_is_log, self.dtype.str, self._wanted_emis))
+        if emis_full is not None:
+            self._res[key] = None
+            self.emis_labels = np.asarray(labels)
+        else:
+            self._res[key] = self._read_outputs_to_convert(key, case_sensitive='upper', usecols=self._emis_usecols()) #may need skip_header=1
+            if self._res[key] is not None:
+                self.emis_labels = np.asarray(self._res[key].dtype.names[1::])
+                emis_full = structured_to_2d(self._res[key], self.emis_labels)
+                if self.emis_is_log:
+                    np.power(10., emis_full, out=emis_full)
+                emis_full = emis_full.astype(self.dtype, copy=False)
+                if self._use_mmap:
+                    emis_full = self._cache.put_array(key, key, emis_full, list(self.emis_labels),
+                                                args=(self.emis_is_log, self.dtype.str, self._wanted_emis))
+        if emis_full is not None:
             if self.cloudy_version_major > 13:
                 # We are with c17+ and will create emis_labels_13
                 self.emis_labels_17 = self.emis_labels
-                self.emis_labels_13 = []
-                for label in self.emis_labels:
-                    try:
-                        self.emis_labels_13.append(convert_c17_c13(label))
-                    except:
-                        self.emis_labels_13.append('')
-                self.emis_labels_13 = np.array(self.emis_labels_13, dtype=str)
+                self.emis_labels_13 = convert_labels(self.emis_labels, from_='c17')
             else:
                 # We are with c13 and will create emis_labels_17
                 self.emis_labels_13 = self.emis_labels
-                self.emis_labels_17 = []
-                for label in self.emis_labels:
-                    try:
-                        self.emis_labels_17.append(convert_c13_c17(label))
-                    except:
-                        self.emis_labels_17.append('')
-                self.emis_labels_17 = np.array(self.emis_labels_17, dtype=str)
+                self.emis_labels_17 = convert_labels(self.emis_labels, from_='c13')
             self.n_emis = np.size(self.emis_labels)
             self.log_.message('Number of emissivities: {0.n_emis:d}'.format(self), calling = self.calling)
-            self.emis_full = np.zeros((self.n_emis, np.size(emis)))
-            for i, label in enumerate(self.emis_labels):
-                self.emis_full[i] = trans_emis(emis[label])
-            if 'H__1__4861A' in self.emis_labels:
-                self.Hbeta_label = 'H__1__4861A'
-            elif 'H__1_486133A' in self.emis_labels:
-                self.Hbeta_label = 'H__1_486133A'
-            elif 'H__1_486132A' in self.emis_labels:
-                self.Hbeta_label = 'H__1_486132A'
-            elif 'H__1_486136A' in self.emis_labels:
-                self.Hbeta_label = 'H__1_486136A'
-            else:
-                self.Hbeta_label = None
+            self.emis_full = emis_full
+            self._set_emis_index()
+            self.Hbeta_label = None
+            for label in _HBETA_LABELS:
+                if label in self.emis_labels:
+                    self.Hbeta_label = label
+                    break
             if self.Hbeta_label is not None:
                 self.Hbeta_full = (self.get_emis(self.Hbeta_label) * self.dvff).cumsum()
                 self.__Hbeta_cut = self.Hbeta_full[-1]
 
+    def _emis_usecols(self):
+        """
+        Return the indices of the columns of the .emis file corresponding to the emissivities
+        asked by the user (emis_labels parameter) and to Hbeta, or None to read all the columns.
+        """
+        file_ = self.model_name + '.emis'
+        if self._wanted_emis is None or not os.path.exists(file_):
+            return None
+        names = read_cloudy_names(file_, case_sensitive='upper')
+        wanted = set(_HBETA_LABELS)
+        for label in self._wanted_emis:
+            label = validate_names([label], case_sensitive='upper')[0]
+            found = False
+            for label_version in (label, convert_labels([label], from_='c13')[0],
+                                  convert_labels([label], from_='c17')[0]):
+                if label_version in names:
+                    wanted.add(label_version)
+                    found = True
+            if not found:
+                self.log_.warn('{0} not in {1}'.format(label, file_), calling=self.calling)
+        usecols = [0] + [i for i, name in enumerate(names) if i > 0 and name in wanted]
+        if len(usecols) == len(names):
+            return None
+        return usecols
+
+    def _ionic_usecols(self, elem):
+        """
+        Return the indices of the columns of the .ele_X file corresponding to the first ionization stages
+        asked by the user (ions parameter), or None to read all the columns.
+        """
+        if isinstance(self._wanted_ions, dict):
+            n_ions = self._wanted_ions.get(elem)
+        else:
+            n_ions = self._wanted_ions
+        if n_ions is None:
+            return None
+        return tuple(range(n_ions + 1))
+
     def _init_ionic(self, elem, str_key = 'ele_'):
         key = str_key + elem
-        self._res[key] = self.read_outputs(key)
+        ionic = None
+        usecols = self._ionic_usecols(elem)
+        if self._use_mmap:
+            ionic, ionic_names = self._cache.get_array(key, key, args=(self.dtype.str, usecols))
+        if ionic is not None:
+            self._res[key] = None
+            self.ionic_names[elem] = tuple(ionic_names)
+            self.n_ions[elem] = len(ionic_names)
+            self.ionic_full[elem] = ionic
+            return
+        if usecols is not None and os.path.exists(self.model_name + '.' + key):
+            if len(usecols) >= len(read_cloudy_names(self.model_name + '.' + key)):
+                usecols = None
+        self._res[key] = self._read_outputs_to_convert(key, usecols=usecols)
         if self._res[key] is not None:
             ionic_names = self._res[key].dtype.names[1:]
             n_ions = np.size(ionic_names)
-            ionic = np.zeros((n_ions, self.n_zones))
             try:
-                for i, ion in enumerate(ionic_names):
-                    ionic[i, :] = self._res[key][ion]
+                ionic = structured_to_2d(self._res[key], ionic_names, dtype=self.dtype)
+                if ionic.shape[1] != self.n_zones:
+                    raise ValueError('ionic fractions not defined for all the zones')
+                if self._use_mmap:
+                    ionic = self._cache.put_array(key, key, ionic, list(ionic_names),
+                                            args=(self.dtype.str, self._ionic_usecols(elem)))
                 self.ionic_names[elem] = ionic_names
                 self.n_ions[elem] = n_ions
                 self.ionic_full[elem] = ionic
                 self.log_.message('filling ' + elem + ' with ' + str(n_ions) + ' columns', calling = self.calling)
             except:
                 self.log_.message('File {0} not read'.format(key))
-        self.n_elements = np.size(list(self.n_ions.keys()))
 
     def _init_heatcool(self):
         key = 'heat'
@@ -420,7 +611,18 @@ class CloudyModel(object):
 
     def _init_cont(self):
         key = 'cont'
-        self._res[key] = self.read_outputs(key, usecols=(0, 1, 2, 3, 4, 5, 6))
+        cont = None
+        if self._use_mmap:
+            cont, names = self._cache.get_array(key, key, args=self.dtype.str)
+        if cont is None:
+            cont = self._read_outputs_to_convert(key, usecols=(0, 1, 2, 3, 4, 5, 6))
+            if cont is not None and self.dtype != cont.dtype[1]:
+                # the energy mesh is kept in float64
+                cont = cont.astype([(name, cont.dtype[i] if i == 0 else self.dtype)
+                                    for i, name in enumerate(cont.dtype.names)])
+            if self._use_mmap and cont is not None:
+                cont = self._cache.put_array(key, key, cont, args=self.dtype.str)
+        self._res[key] = cont
 
     def _init_opd(self):
         key = 'opd'
@@ -440,7 +642,7 @@ class CloudyModel(object):
     def _init_abunds(self):
         key = 'abunds'
         self._res[key] = self.read_outputs(key)
-        self.abunds_full = self._res[key]
+        self.abunds_full = self._res[key].copy()
         names_translator = {'abund_H':'H',
                             'HELI':'He',
                             'LITH':'Li',
@@ -504,37 +706,45 @@ class CloudyModel(object):
         self._res[key] = self.read_outputs(key, skip_header=sk_header)
         if self._res[key] is not None:
             self.gtemp_labels = list(self._res[key].dtype.names[1:])
-            gtemp = self._res[key]
             self.n_gtemp = np.size(self.gtemp_labels)
-            self.gtemp_full = np.zeros((self.n_gtemp, np.size(gtemp) - sk_header2))
-            self.gsize = np.zeros((self.n_gtemp))
-            for i, label in enumerate(self.gtemp_labels):
-                self.gtemp_full[i] = gtemp[label][sk_header2::]
-                self.gsize[i] = gtemp[label][0]
+            gtemp = structured_to_2d(self._res[key], self.gtemp_labels)
+            self.gtemp_full = np.ascontiguousarray(gtemp[:, sk_header2:], dtype=self.dtype)
+            self.gsize = gtemp[:, 0].copy()
         key = 'gabund'
         self._res[key] = self.read_outputs(key, skip_header=sk_header2, usecols=np.arange(self.n_gtemp + 1))
         if self._res[key] is not None:
             self.gabund_labels = self._res[key].dtype.names[1:]
-            gabund = self._res[key]
             self.n_gabund = np.size(self.gabund_labels)
-            self.gabund_full = np.zeros((self.n_gabund, np.size(gabund) - sk_header2))
-            self.gasize = np.zeros((self.n_gabund))
-            for i, label in enumerate(self.gabund_labels):
-                self.gabund_full[i] = gabund[label][sk_header2::]
-                self.gasize[i] = gabund[label][0]
+            gabund = structured_to_2d(self._res[key], self.gabund_labels)
+            self.gabund_full = np.ascontiguousarray(gabund[:, sk_header2:], dtype=self.dtype)
+            self.gasize = gabund[:, 0].copy()
         key = 'gdgrat'
         self._res[key] = self.read_outputs(key, skip_header=sk_header2, usecols=np.arange(self.n_gtemp + 1))
         if self._res[key] is not None:
             self.gdgrat_labels = self._res[key].dtype.names[1:]
-            gdgrat = self._res[key]
             self.n_gdgrat = np.size(self.gdgrat_labels)
-            self.gdgrat_full = np.zeros((self.n_gdgrat, np.size(gdgrat) - sk_header2))
-            self.gdsize = np.zeros((self.n_gdgrat))
-            for i, label in enumerate(self.gdgrat_labels):
-                self.gdgrat_full[i] = gdgrat[label][sk_header2::]
-                self.gdsize[i] = gdgrat[label][0]
-
-    def _read_stout(self, emis_is_log):
+            gdgrat = structured_to_2d(self._res[key], self.gdgrat_labels)
+            self.gdgrat_full = np.ascontiguousarray(gdgrat[:, sk_header2:], dtype=self.dtype)
+            self.gdsize = gdgrat[:, 0].copy()
+
+    def _init_stout(self, emis_is_log, read_out_until=None):
+        """
+        Read the .out file, or take its results from the cache if the file did not change.
+        """
+        args = repr((emis_is_log, self.cloudy_version_major, self.distance, read_out_until))
+        if self._use_cache:
+            stout = self._cache.get_stout(args)
+            if stout is not None:
+                self.__dict__.update(stout)
+                self.log_.message(self.model_name + '.out read from cache', calling=self.calling)
+                return
+        before = {key: self.__dict__[key] for key in _STOUT_ATTRS if key in self.__dict__}
+        self._read_stout(emis_is_log=emis_is_log, read_out_until=read_out_until)
+        if self._use_cache and self.out_exists:
+            self._cache.put_stout(args, {key: self.__dict__[key] for key in _STOUT_ATTRS if key in self.__dict__
+                                         and (key not in before or self.__dict__[key] is not before[key])})
+
+    def _read_stout(self, emis_is_log, read_out_until=None):
         self.out = {}
         file_name = self.model_name + '.out'
         self.C3D_comments = []
@@ -554,102 +764,95 @@ class CloudyModel(object):
         self.out['Cloudy ends'] = ''
         self.out['stop'] = ''
         self.cloudy_version = ''
-        for line in file_:
-            if 'Cloudy' in line and 'testing' not in line and 'Please' not in line and self.cloudy_version == '':
-                self.cloudy_version = line.strip()
-                if self.cloudy_version_major is None:
-                    version_match_obj = re.match("Cloudy \(?c?(\d\d)\.\d\d\)?", self.cloudy_version, flags=0)
-                    try:
-                        self.cloudy_version_major = version_match_obj.group(1)
-                        self.cloudy_version_major = int(self.cloudy_version_major)
-                    except:
-                        self.log_.error(f'pyCloudy unable to determine version from "{self.cloudy_version}". Try to set it by hand using cloudy_version_major keyword', calling = self.calling)
-            elif line[0:8] == ' ####  1':
-                self.out['###First'] = line
-            elif line[0:4] == ' ###':
-                self.out['###Last'] = line
-            elif 'Calculation stopped' in line:
-                self.out['stop'] = line
-            elif 'Cloudy ends' in line:
-                self.out['Cloudy ends'] = line
-            elif 'something went wrong' in line:
-                self.out['wrong'] = line
-            elif 'Gas Phase Chemical Composition' in line:
-                for i in range(4):
-                    self.out['Chem' + str(i + 1)] = next(file_)
-            elif 'Grain Chemical Composition' in line:
-                self.out['GrainChem'] = next(file_)
-            elif 'Dust to gas ratio' in line:
-                self.out['D/G'] = line
-            elif "* grains" in line:
-                self.out['grains'] = line
-            elif 'iterate' in line:
-                self.out['iterate'] = line
-            elif 'Hi-Con' in line:
-                i = 1
-                while i < 8:
-                    line = next(file_)
-                    if line != '\n' and "WARN" not in line:
-                        self.out['SED' + str(i)] = line
-                        i += 1
-            elif 'table star' in line:
-                self.out['table star'] = line
-            elif 'table SED' in line:
-                self.out['table SED'] = line
-            elif 'Blackbody' in line:
-                self.out['Blackbody'] = line
-                try:
-                    self.Teff = np.float64(pc.sextract(self.out['Blackbody'], 'Blackbody ', '*'))
-                except:
-                    try:
-                        self.Teff = np.float64(pc.sextract(self.out['Blackbody'], 'Blackbody ', '\n'))
-                    except:
-                        self.Teff = None
-            elif 'hden' in line:
-                self.out['hden'] = line
-            elif 'dlaw' in line:
-                self.out['dlaw'] = line
-            elif 'TOTL  4861A' in line:
-                self.out['Hbeta'] = line
-            elif 'H  1      4861.36A' in line:
-                self.out['Hbeta'] = line
-            elif 'H  1      4861.33A' in line:
-                self.out['Hbeta'] = line
-            elif 'luminosity' in line:
-                self.out['luminosity'] = line
-            elif 'turbulence' in line:
-                self.out['turbulence'] = line
-            elif 'fudge' in line:
-                self.out['fudge'] = line
-            elif 'distance' in line:
-                self.out['distance'] = line
-                dist_str = sextract(line, '=', 'kpc')
-                dist_set = False
-                if 'linear' in line:
-                    correc = lambda x: x
-                else:
-                    correc = lambda x: 10.**x
-                if dist_str != '':
-                    self.distance = correc(np.float64(dist_str))
-                    dist_set = True
-                dist_str = sextract(line, '=', 'parsecs')
-                if dist_str != '':
-                    self.distance = correc(np.float64(dist_str)) / 1e3
-                    dist_set = True
-                dist_str = sextract(line, '=', 'cm')
-                if dist_str != '':
-                    self.distance = correc(np.float64(dist_str)) / pc.CST.KPC
-                    dist_set = True
-                if not dist_set:
-                    self.log_.warn('Unable to determine distance', calling = self.calling)
-            elif '#C3D' in line:
-                self.C3D_comments.append(line)
-            elif '# **' in line:
-                self.comments.append(line)
-            elif line[0:3] == ' C-':
-                self.cautions.append(line)
-            elif line[0:3] == '  !' or line[0:3] == ' W-':
-                self.warnings.append(line)
+
+        def next_line():
+            # return the line starting at pos and move pos to the following one
+            nonlocal pos
+            if pos >= len(text):
+                return file_.readline()
+            end = text.find('\n', pos) + 1 or len(text)
+            line = text[pos:end]
+            pos = end
+            return line
+
+        # The file is read by blocks of lines. Only the lines containing one of the substrings of _STOUT_DISPATCH
+        # are considered, the first substring of the table found in the line decides what is done with it.
+        stop = False
+        while not stop:
+            text = ''.join(file_.readlines(_STOUT_BLOCK_SIZE))
+            if text == '':
+                break
+            pos = 0
+            for line_start in _find_lines(text):
+                if line_start < pos:
+                    # already read by next_line
+                    continue
+                pos = line_start
+                line = next_line()
+                for sub, at_start, key in _STOUT_DISPATCH:
+                    if not (line.startswith(sub) if at_start else sub in line):
+                        continue
+                    if key == 'version':
+                        if 'testing' in line or 'Please' in line or self.cloudy_version != '':
+                            continue
+                        self.cloudy_version = line.strip()
+                        if self.cloudy_version_major is None:
+                            version_match_obj = re.match("Cloudy \(?c?(\d\d)\.\d\d\)?", self.cloudy_version, flags=0)
+                            try:
+                                self.cloudy_version_major = version_match_obj.group(1)
+                                self.cloudy_version_major = int(self.cloudy_version_major)
+                            except:
+                                self.log_.error(f'pyCloudy unable to determine version from "{self.cloudy_version}". Try to set it by hand using cloudy_version_major keyword', calling = self.calling)
+                    elif key == 'Chem':
+                        for i in range(4):
+                            self.out['Chem' + str(i + 1)] = next_line()
+                    elif key == 'GrainChem':
+                        self.out['GrainChem'] = next_line()
+                    elif key == 'SED':
+                        i = 1
+                        while i < 8:
+                            line = next_line()
+                            if line != '\n' and "WARN" not in line:
+                                self.out['SED' + str(i)] = line
+                                i += 1
+                    elif key == 'Blackbody':
+                        self.out['Blackbody'] = line
+                        try:
+                            self.Teff = np.float64(pc.sextract(self.out['Blackbody'], 'Blackbody ', '*'))
+                        except:
+                            try:
+                                self.Teff = np.float64(pc.sextract(self.out['Blackbody'], 'Blackbody ', '\n'))
+                            except:
+                                self.Teff = None
+                    elif key == 'distance':
+                        self.out['distance'] = line
+                        dist_str = sextract(line, '=', 'kpc')
+                        dist_set = False
+                        if 'linear' in line:
+                            correc = lambda x: x
+                        else:
+                            correc = lambda x: 10.**x
+                        if dist_str != '':
+                            self.distance = correc(np.float64(dist_str))
+                            dist_set = True
+                        dist_str = sextract(line, '=', 'parsecs')
+                        if dist_str != '':
+                            self.distance = correc(np.float64(dist_str)) / 1e3
+                            dist_set = True
+                        dist_str = sextract(line, '=', 'cm')
+                        if dist_str != '':
+                            self.distance = correc(np.float64(dist_str)) / pc.CST.KPC
+                            dist_set = True
+                        if not dist_set:
+                            self.log_.warn('Unable to determine distance', calling = self.calling)
+                    elif key in ('C3D_comments', 'comments', 'cautions', 'warnings'):
+                        getattr(self, key).append(line)
+                    else:
+                        self.out[key] = line
+                    break
+                if read_out_until is not None and read_out_until in self.out:
+                    stop = True
+                    break
         file_.close()
         try:
             if int(self.cloudy_version_major) >= 17:
@@ -722,7 +925,42 @@ class CloudyModel(object):
         return True
 
     def read_outputs(self, extension, delimiter='\t', comments=';', names=True, **kwargs):
+        """
+        Read a Cloudy save file and return a structured array.
+        The file is read using read_cloudy_tab, and np.genfromtxt is only used when the file is not
+        a regular table of numbers (missing values, strings, etc).
+        **kwargs are passed to read_cloudy_tab or np.genfromtxt (e.g. usecols, skip_header, case_sensitive)
+        """
         file_ = self.model_name + '.' + extension
+        if self._use_cache:
+            args = repr(sorted(dict(delimiter=delimiter, comments=comments, names=names, **kwargs).items()))
+            is_cached, res = self._cache.get(extension, args)
+            if is_cached:
+                self.log_.message(file_ + ' read from cache', calling=self.calling)
+            else:
+                res = self._read_outputs(file_, delimiter=delimiter, comments=comments, names=names, **kwargs)
+                self._cache.put(extension, args, res)
+            return res
+        return self._read_outputs(file_, delimiter=delimiter, comments=comments, names=names, **kwargs)
+
+    def _read_outputs_to_convert(self, extension, **kwargs):
+        """
+        read_outputs for the files converted into memory-mapped arrays (use_mmap): the parsed table
+        is not written in the cache, the converted array is.
+        """
+        if self._use_mmap:
+            return self._read_outputs(self.model_name + '.' + extension, delimiter='\t', comments=';', names=True,
+                                      **kwargs)
+        return self.read_outputs(extension, **kwargs)
+
+    def _read_outputs(self, file_, delimiter, comments, names, **kwargs):
+        if os.path.exists(file_) and os.path.splitext(file_)[1][1:] not in _GENFROMTXT_EXT:
+            try:
+                res = read_cloudy_tab(file_, delimiter=delimiter, comments=comments, names=names, **kwargs)
+                self.log_.message(file_ + ' read', calling=self.calling)
+                return res
+            except (ValueError, TypeError, IndexError):
+                self.log_.debug(file_ + ' not a regular table, using genfromtxt', calling=self.calling)
         if os.path.exists(file_):
             try:
                 res = np.genfromtxt(file_, delimiter=delimiter, comments=comments, names=names, **kwargs) # some arguments can be sent here
@@ -748,9 +986,12 @@ class CloudyModel(object):
     def _get_over_range(self, var):
 
         if self.n_zones > 1:
-            return var[self.r_range]
+            return _read_only(var[self._r_index])
         else:
             if type(var) is np.ndarray:
+                if self.n_zones == 1 and self.n_zones_full > 1:
+                    # the zone in r_range, as given by the views and the cumulative sums
+                    return var[self._r_index].ravel()[0]
                 return var.ravel()[0]
             else:
                 return var
@@ -761,13 +1002,15 @@ class CloudyModel(object):
         if self.empty_model:
             return None
         else:
-            return self.zones_full[self.r_range]
+            return _read_only(self.zones_full[self._r_index])
 
     ## number of zones [int]
     @property
     def n_zones(self):
         if self.empty_model:
             return 0
+        elif self.n_zones_full > 1:
+            return self._get_r_range_cache()['n_zones']
         else:
             return self.zones.size
 
@@ -803,7 +1046,10 @@ class CloudyModel(object):
     @property
     def drff(self):
         """ array of dr (on r_range)"""
-        return self._get_over_range(self.dr_full * self.ff_full)
+        cache = self._get_r_range_cache()
+        if 'drff' not in cache:
+            cache['drff'] = self._get_over_range(self.dr_full * self.ff_full)
+        return cache['drff']
 
     ## volume of each zone [float array] (cm^3)
     @property
@@ -815,7 +1061,10 @@ class CloudyModel(object):
     @property
     def dvff(self):
         """ array of volume element (on r_range)"""
-        return self._get_over_range(self.dv_full * self.ff_full)
+        cache = self._get_r_range_cache()
+        if 'dvff' not in cache:
+            cache['dvff'] = self._get_over_range(self.dv_full * self.ff_full)
+        return cache['dvff']
 
     ## electron density [float array] (cm^-3)
     @property
@@ -873,12 +1122,9 @@ class CloudyModel(object):
 
     def _quiet_div(self, a, b):
         if a is None or b is None:
-            to_return = None
+            return None
         else:
-            np.seterr(all="ignore")
-            to_return = a / b
-            np.seterr(all=None)
-        return to_return
+            return quiet_divide(a, b)
 
     ##rad_integ(a) = \f$\int a.ff.dr\f$
     def rad_integ(self, a):
@@ -946,28 +1192,28 @@ class CloudyModel(object):
             ionic fraction of (elem, ion).
         """
         if self.is_valid_ion(elem, ion):
-            return self.ionic_full[elem][ion][self.r_range]
+            return _read_only(self.ionic_full[elem][ion][self._r_index])
         else:
             return None
 
     @property
     def gtemp(self):
         if self.gtemp_full is not None:
-            return self.gtemp_full[:,self.r_range]
+            return _read_only(self.gtemp_full[:, self._r_index])
         else:
             return None
 
     @property
     def gabund(self):
         if self.gabund_full is not None:
-            return self.gabund_full[:,self.r_range]
+            return _read_only(self.gabund_full[:, self._r_index])
         else:
             return None
 
     @property
     def gdgrat(self):
         if self.gdgrat_full is not None:
-            return self.gdgrat_full[:,self.r_range]
+            return _read_only(self.gdgrat_full[:, self._r_index])
         else:
             return None
 
@@ -1191,13 +1437,38 @@ class CloudyModel(object):
             self.log_.warn(err, calling = self.calling)
             return None
 
+    def _set_line_index(self):
+        self._line_index_labels = (self.line_labels_13, self.line_labels_17)
+        self._line_index = _label_index(self.line_labels_13, self.line_labels_17)
+
+    def _set_emis_index(self):
+        self._emis_index_labels = (self.emis_labels_13, self.emis_labels_17)
+        self._emis_index = _label_index(self.emis_labels_13, self.emis_labels_17)
+
+    def _get_line_index(self):
+        """
+        return the dictionary label -> index of the lines, rebuilt if the label arrays have been replaced
+        """
+        labels_13, labels_17 = self.line_labels_13, self.line_labels_17
+        labels = self.__dict__.get('_line_index_labels', (None, None))
+        if labels[0] is not labels_13 or labels[1] is not labels_17:
+            self._set_line_index()
+        return self._line_index
+
+    def _get_emis_index(self):
+        """
+        return the dictionary label -> index of the emissivities, rebuilt if the label arrays have been replaced
+        """
+        labels_13, labels_17 = self.emis_labels_13, self.emis_labels_17
+        labels = self.__dict__.get('_emis_index_labels', (None, None))
+        if labels[0] is not labels_13 or labels[1] is not labels_17:
+            self._set_emis_index()
+        return self._emis_index
+
     def _i_line(self, ref):
         if type(ref) is str or type(ref) is np.str_:
-            if ref in self.line_labels_13:
-                to_return = np.argwhere(self.line_labels_13 == ref)[0][0]
-            elif ref in self.line_labels_17:
-                to_return = np.argwhere(self.line_labels_17 == ref)[0][0]
-            else:
+            to_return = self._get_line_index().get(ref)
+            if to_return is None:
                 self.log_.warn(ref + ' is not a correct line reference - 1', calling = self.calling)
                 to_return = None
         elif type(ref) is int or type(ref) is np.int32:
@@ -1219,11 +1490,8 @@ class CloudyModel(object):
             the indice of the line in the emis liste
         """
         if type(ref) is str or type(ref) is np.str_:
-            if ref in self.emis_labels_13:
-                to_return = np.argwhere(self.emis_labels_13 == ref)[0][0]
-            elif ref in self.emis_labels_17:
-                to_return = np.argwhere(self.emis_labels_17 == ref)[0][0]
-            else:
+            to_return = self._get_emis_index().get(ref)
+            if to_return is None:
                 self.log_.warn(ref + ' is not a correct line reference - 1', calling = self.calling)
                 to_return = None
         elif type(ref) is int or type(ref) is np.int32:
@@ -1245,9 +1513,7 @@ class CloudyModel(object):
             the label of the line
         """
         if type(ref) is str or type(ref) is np.str_:
-            if ref in self.emis_labels_13:
-                to_return = ref
-            elif ref in self.emis_labels_17:
+            if ref in self._get_emis_index():
                 to_return = ref
             else:
                 self.log_.warn(ref + ' is not a correct line reference - 1', calling = self.calling)
@@ -1269,8 +1535,9 @@ class CloudyModel(object):
         Return line intensity.
         ref can be a label or a number (starting at 0 with the first line)
         """
-        if self._i_line(ref) is not None:
-            return self.lines[self._i_line(ref)]
+        i_line = self._i_line(ref)
+        if i_line is not None:
+            return self.lines[i_line]
         else:
             return None
 
@@ -1281,8 +1548,9 @@ class CloudyModel(object):
         param:
             ref can be a label or a number (starting at 0 with the first line)
         """
-        if self._i_emis(ref) is not None:
-            return self.emis_full[self._i_emis(ref)][self.r_range]
+        i_emis = self._i_emis(ref)
+        if i_emis is not None:
+            return _read_only(self.emis_full[i_emis][self._r_index])
         else:
             return None
 
@@ -1362,43 +1630,330 @@ class CloudyModel(object):
         """
         return self.vol_mean((self.te - self.get_T0_emis(ref)) ** 2., self.get_emis(ref)) / self.get_T0_emis(ref) ** 2
 
+    def _get_range_2d(self, a):
+        """ Return a[:, r_range] as a 2D array, even if there is only one zone in the range """
+        res = a[:, self._r_index]
+        return res.reshape(res.shape[0], -1)
+
+    ## vol_integ_all(A) = \f$\int A_i.ff.dV\f$ for each row A_i of A
+    def vol_integ_all(self, a):
+        """
+        Integral on the volume of each row of the 2D array a (defined on all the zones, as emis_full),
+        computed in one matrix product.
+        """
+        if a is None or self.dv is None:
+            return None
+        else:
+            return np.dot(self._get_range_2d(a), np.atleast_1d(self.dvff))
+
+    ## rad_integ_all(A) = \f$\int A_i.ff.dr\f$ for each row A_i of A
+    def rad_integ_all(self, a):
+        """
+        Integral on the radius of each row of the 2D array a (defined on all the zones, as emis_full),
+        computed in one matrix product.
+        """
+        if a is None or self.dr is None:
+            return None
+        else:
+            return np.dot(self._get_range_2d(a), np.atleast_1d(self.drff))
+
+    @property
+    def _use_cumul(self):
+        """ True if the cuts can be evaluated from cumulative sums along the zones (r_range is a slice) """
+        return self.n_zones_full is not None and self.n_zones_full > 1 and isinstance(self._r_index, slice)
+
+    def _get_cumul(self, key, sources, integrand):
+        """
+        Return the cumulative sums along the zones (last axis) of the array returned by integrand(),
+        from the first zone of r_range and starting with 0, so that no sums are subtracted (the integrands
+        may span many orders of magnitude). They are cached with the given key and the first zone, until
+        one of the sources (the arrays on which integrand depends) is replaced, or until
+        reset_cumul_cache is called or the radial or physical arrays are read again.
+        Only used to evaluate many cuts at once (get_*_cuts and get_cuts_table).
+        """
+        if not self._use_cumul:
+            self.log_.error('cuts are not available for this model', calling=self.calling)
+        start = self._r_index.start
+        sources = tuple(sources) + (self.dv_full, self.dr_full, self.ff_full)
+        cached = self._cumul_cache.get(key)
+        if cached is None or cached[0] != start or not _same_arrays(cached[1], sources):
+            a = integrand()[..., start:]
+            cumul = np.zeros(a.shape[:-1] + (a.shape[-1] + 1,))
+            np.cumsum(a, axis=-1, out=cumul[..., 1:])
+            cached = (start, sources, cumul)
+            self._cumul_cache[key] = cached
+        return cached[2]
+
+    def _cumul_integ(self, cumul, stops):
+        """
+        Return the integrals from depth_in_cut to each of the cuts, from the cumulative sums cumul.
+        stops is the array of indices of the first zone beyond each cut, as returned by _get_cut_stops.
+        """
+        return cumul[..., np.clip(stops - self._r_index.start, 0, cumul.shape[-1] - 1)]
+
+    def reset_cumul_cache(self):
+        """
+        Free the cumulative sums used by get_emis_vol_cuts, get_T0_emis_cuts and get_cuts_table.
+        They must be reset if emis_full, te_full, ionic_full, etc. are modified in place.
+        """
+        self._cumul_cache = {}
+
+    def _get_cut_stops(self, depth_out_cuts):
+        """ Indices of the first zone beyond each of the depth_out_cuts, as r_range would use """
+        return np.searchsorted(self.depth_full, depth_out_cuts, side='right')
+
+    def _get_dx_full(self, integ):
+        if integ == 'vol':
+            return self.dv_full * self.ff_full
+        elif integ == 'rad':
+            return self.dr_full * self.ff_full
+        else:
+            self.log_.error("integ must be 'vol' or 'rad'", calling=self.calling)
+
+    def _get_emis_cumul(self, te_power=0):
+        """ Cumulative volume integrals of te**te_power * emissivity of all the lines """
+        emis_full = self.emis_full
+        return self._get_cumul(('emis', te_power), (emis_full, self.te_full),
+                               lambda: emis_full * (self._get_dx_full('vol') * self.te_full ** te_power))
+
+    def get_emis_vol_all(self, at_earth=False):
+        """
+        Same as get_emis_vol, for all the lines of emis_labels at once.
+        return:
+            [float array] of size n_emis
+        """
+        if at_earth:
+            coeff = 4. * np.pi * (self.distance * pc.CST.KPC) ** 2
+        else:
+            coeff = 1.
+        return self.vol_integ_all(self.emis_full) / coeff
+
+    def get_emis_rad_all(self):
+        """
+        Same as get_emis_rad, for all the lines of emis_labels at once.
+        return:
+            [float array] of size n_emis
+        """
+        return self.rad_integ_all(self.emis_full)
+
+    def get_T0_emis_all(self):
+        """
+        Same as get_T0_emis, for all the lines of emis_labels at once.
+        return:
+            [float array] of size n_emis
+        """
+        return self._quiet_div(np.dot(self._get_range_2d(self.emis_full), np.atleast_1d(self.te * self.dvff)),
+                               self.vol_integ_all(self.emis_full))
+
+    def get_emis_vol_cuts(self, depth_out_cuts, at_earth=False):
+        """
+        Volume integrated emissivities of all the lines for each of the outer depths depth_out_cuts
+        (depth_in_cut being unchanged), as get_emis_vol_all would give after setting depth_out_cut.
+        The model is not modified. The integrals are read from cumulative sums computed once per depth_in_cut.
+        return:
+            [float array] of shape (n_emis, len(depth_out_cuts))
+        """
+        if at_earth:
+            coeff = 4. * np.pi * (self.distance * pc.CST.KPC) ** 2
+        else:
+            coeff = 1.
+        stops = self._get_cut_stops(np.atleast_1d(depth_out_cuts))
+        return self._cumul_integ(self._get_emis_cumul(), stops) / coeff
+
+    def get_T0_emis_cuts(self, depth_out_cuts):
+        """
+        Same as get_T0_emis_all, for each of the outer depths depth_out_cuts (see get_emis_vol_cuts).
+        return:
+            [float array] of shape (n_emis, len(depth_out_cuts))
+        """
+        stops = self._get_cut_stops(np.atleast_1d(depth_out_cuts))
+        return self._quiet_div(self._cumul_integ(self._get_emis_cumul(te_power=1), stops),
+                               self._cumul_integ(self._get_emis_cumul(), stops))
+
+    def get_cuts_table(self, kind, values, format_='numpy'):
+        """
+        Integrated quantities of the model for each of the cuts of a given kind, in a single vectorized pass.
+        The result is the same as setting the corresponding *_cut attribute to each value and reading
+        the properties, but the model is not modified (depth_in_cut is kept).
+        param:
+            kind [str] one of 'H_mass', 'Hbeta', 'ColDens', 'r_out', 'depth_out'
+            values [float array] values of the cut (e.g. in solar mass for H_mass)
+            format_ ['numpy' or 'pandas'] type of the returned table
+        return:
+            table with one row per cut and the columns: cut, depth_out_cut, r_out_cut (radius of the last zone),
+            n_zones, H_mass, Hp_mass, ColDens, Hbeta, T0, log_U_mean, log_U_mean_ne, and the volume integrated
+            emissivity of each line of emis_labels. The rows of the cuts that the setter would refuse
+            (lower than the minimal value) are NaN.
+        """
+        if format_ not in ('numpy', 'pandas'):
+            self.log_.error("format_ must be 'numpy' or 'pandas'", calling=self.calling)
+        if not self._use_cumul:
+            self.log_.error('cuts are not available for this model', calling=self.calling)
+        values = np.atleast_1d(np.asarray(values, dtype=float))
+        if kind == 'H_mass':
+            x_full = self.H_mass_full
+        elif kind == 'Hbeta':
+            x_full = self.Hbeta_full
+        elif kind == 'ColDens':
+            x_full = np.cumsum(self.dr_full * self.nH_full * self.ff_full)
+        elif kind == 'r_out':
+            x_full = self.radius_full
+        elif kind == 'depth_out':
+            x_full = self.depth_full
+        else:
+            self.log_.error("kind must be one of 'H_mass', 'Hbeta', 'ColDens', 'r_out', 'depth_out'",
+                            calling=self.calling)
+        if kind == 'depth_out':
+            valid = values >= self.depth_in
+        else:
+            valid = values > x_full[1]
+        if not valid.all():
+            self.log_.warn('{0} {1}_cut lower than the minimal value'.format((~valid).sum(), kind),
+                           calling=self.calling)
+        depth_out_cuts = self.depth_full[np.maximum(np.searchsorted(x_full, values, side='right') - 1, 0)]
+        if kind == 'depth_out':
+            depth_out_cuts = values
+        stops = self._get_cut_stops(depth_out_cuts)
+        start = self._r_index.start
+
+        def mean_cuts(key, sources, a_full, w_full):
+            a_cumul = self._get_cumul((key, 1), sources, lambda: a_full() * w_full * self._get_dx_full('vol'))
+            w_cumul = self._get_cumul((key, 0), sources, lambda: w_full * self._get_dx_full('vol'))
+            return self._quiet_div(self._cumul_integ(a_cumul, stops), self._cumul_integ(w_cumul, stops))
+        nH_vol = self._cumul_integ(self._get_cumul(('nH', 'vol'), (self.nH_full,),
+                                                   lambda: self.nH_full * self._get_dx_full('vol')), stops)
+        nH_rad = self._cumul_integ(self._get_cumul(('nH', 'rad'), (self.nH_full,),
+                                                   lambda: self.nH_full * self._get_dx_full('rad')), stops)
+        get_U_full = lambda: self.Phi0 * (self.r_in / self.radius_full) ** 2 / (self.nH_full * pc.CST.CLIGHT)
+        U_sources = (self.radius_full, self.nH_full)
+        columns = [('cut', values),
+                   ('depth_out_cut', depth_out_cuts),
+                   ('r_out_cut', self.radius_full[np.maximum(stops - 1, 0)]),
+                   ('n_zones', stops - start),
+                   ('H_mass', nH_vol * pc.CST.HMASS / pc.CST.SUN_MASS)]
+        if self.is_valid_ion('H', 1):
+            nHp_vol = self._cumul_integ(self._get_cumul(('Hp', 'vol'), (self.ionic_full['H'], self.nH_full),
+                                                       lambda: self.ionic_full['H'] * (self.nH_full *
+                                                                                       self._get_dx_full('vol'))),
+                                        stops)[1]
+            columns.append(('Hp_mass', nHp_vol * pc.CST.HMASS / pc.CST.SUN_MASS))
+        columns.append(('ColDens', nH_rad))
+        if self.emis_full is not None:
+            emis_vol = self.get_emis_vol_cuts(depth_out_cuts)
+            if self.Hbeta_label is not None:
+                columns.append(('Hbeta', emis_vol[self._i_emis(self.Hbeta_label)]))
+        columns.append(('T0', mean_cuts('te_nenH', (self.te_full, self.nenH_full), lambda: self.te_full,
+                                        self.nenH_full)))
+        columns.append(('log_U_mean', np.log10(mean_cuts('U', U_sources, get_U_full,
+                                                         np.ones_like(self.radius_full)))))
+        columns.append(('log_U_mean_ne', np.log10(mean_cuts('U_nenH', U_sources + (self.nenH_full,), get_U_full,
+                                                            self.nenH_full))))
+        if self.emis_full is not None:
+            columns.extend(zip(self.emis_labels, emis_vol))
+        res = np.zeros(values.size, dtype=[(str(name), np.float64) for name, col in columns])
+        for name, col in columns:
+            res[str(name)] = col
+        res[~valid] = tuple(np.nan for name, col in columns)
+        if format_ == 'pandas':
+            if pc.config.INSTALLED['pandas']:
+                import pandas as pd
+                return pd.DataFrame(res)
+            else:
+                self.log_.error('pandas is not available, use format_="numpy"', calling=self.calling)
+        return res
+
+    def get_t2_emis_all(self):
+        """
+        Same as get_t2_emis, for all the lines of emis_labels at once.
+        return:
+            [float array] of size n_emis
+        """
+        emis = self._get_range_2d(self.emis_full)
+        dvff = np.atleast_1d(self.dvff)
+        te = np.atleast_1d(self.te)
+        norm = np.dot(emis, dvff)
+        T0 = self._quiet_div(np.dot(emis, te * dvff), norm)
+        te2 = self._quiet_div(np.dot(emis, te ** 2 * dvff), norm)
+        return self._quiet_div(te2 - T0 ** 2, T0 ** 2)
+
+    def _get_ion_all(self, integ, weight, mean_te):
+        if integ == 'vol':
+            dx = np.atleast_1d(self.dvff)
+        elif integ == 'rad':
+            dx = np.atleast_1d(self.drff)
+        else:
+            self.log_.error("integ must be 'vol' or 'rad'", calling=self.calling)
+        if weight == 'ne':
+            w = np.atleast_1d(self.nenH) * dx
+        elif weight == 'H':
+            w = np.atleast_1d(self.nH) * dx
+        else:
+            self.log_.error("weight must be 'ne' or 'H'", calling=self.calling)
+        te_w = np.atleast_1d(self.te) * w
+        res = {}
+        for elem in self.liste_elem:
+            ionic = self._get_range_2d(self.ionic_full[elem])
+            if mean_te:
+                res[elem] = self._quiet_div(np.dot(ionic, te_w), np.dot(ionic, w))
+            else:
+                res[elem] = self._quiet_div(np.dot(ionic, w), w.sum())
+        return res
+
+    def get_ab_ion_all(self, integ='vol', weight='ne'):
+        """
+        Ionic fractions of all the ions of all the elements, integrated at once.
+        param:
+            integ ['vol' or 'rad'] integration on the volume or on the radius
+            weight ['ne' or 'H'] weight by ne.nH (as get_ab_ion_vol_ne) or by nH (as get_ab_ion_vol)
+        return:
+            dictionary {elem: [float array] of size n_ions[elem]}
+        """
+        return self._get_ion_all(integ, weight, mean_te=False)
+
+    def get_T0_ion_all(self, integ='vol', weight='ne'):
+        """
+        Electron temperatures weighted by the abundances of all the ions of all the elements, integrated at once.
+        param:
+            integ ['vol' or 'rad'] integration on the volume or on the radius
+            weight ['ne' or 'H'] weight by ne.nH.X^i/X (as get_T0_ion_vol_ne) or by nH.X^i/X (as get_T0_ion_vol)
+        return:
+            dictionary {elem: [float array] of size n_ions[elem]}
+        """
+        return self._get_ion_all(integ, weight, mean_te=True)
+
+    def _get_continuum(self):
+        """ Return the _Continuum of the model, built when first used (and again if the cont file is read again) """
+        cont = self._res['cont']
+        if cont is None:
+            self.log_.warn('No continuum', calling = self.calling)
+            return None
+        if self._continuum is None or self._continuum.source is not cont:
+            self._continuum = _Continuum(cont)
+        return self._continuum
+
     ## Return the wavelength/energy/frequency array
     def get_cont_x(self, unit='Ryd'):
         """
         param:
-            unit : one of ['Ryd','eV','Ang','mu','cm-1','Hz', 'kHz', 'MHz', 'GHz']
+            unit : one of ['Ryd','eV','Ang','mu','cm-1','Hz', 'kHz', 'MHz', 'GHz'],
+                or a list of them (an array of shape (n_unit, n_energies) is then returned)
         return:
-            continuum X: wavelength, energys, wv number, or frequency
+            continuum X: wavelength, energys, wv number, or frequency (read-only)
         """
-        if 'Cont_nu' in self._res['cont'].dtype.names:
-            hnu = self._res['cont']['Cont_nu']
-        elif 'Cont__nu' in self._res['cont'].dtype.names:
-            hnu = self._res['cont']['Cont__nu']
-        else:
+        continuum = self._get_continuum()
+        if continuum is None:
+            return None
+        if continuum.hnu is None:
             self.log_.warn('Hnu NOT defined in the continuum', calling = self.calling)
             return None
-        if unit == 'Ryd':
-            to_return = hnu
-        elif unit == 'eV':
-            to_return = hnu * pc.CST.RYD_EV
-        elif unit == 'Ang':
-            to_return = pc.CST.RYD_ANG / hnu
-        elif unit == 'mu':
-            to_return = pc.CST.RYD_ANG / hnu / 1e4
-        elif unit == 'cm-1':
-            to_return = hnu * pc.CST.RYD
-        elif unit == 'Hz':
-            to_return = hnu * pc.CST.RYD * pc.CST.CLIGHT
-        elif unit == 'kHz':
-            to_return = hnu * pc.CST.RYD * pc.CST.CLIGHT / 1e3
-        elif unit == 'MHz':
-            to_return = hnu * pc.CST.RYD * pc.CST.CLIGHT / 1e6
-        elif unit == 'GHz':
-            to_return = hnu * pc.CST.RYD * pc.CST.CLIGHT / 1e9
-        else:
-            self.log_.warn("Unit must be one of: ['Ryd','eV','Ang','mu','cm-1','Hz']", calling = self.calling)
-            to_return = None
-        return to_return
+        units = unit if isinstance(unit, (list, tuple)) else [unit]
+        for u in units:
+            if u not in _CONT_X_UNITS:
+                self.log_.warn("Unit must be one of: ['Ryd','eV','Ang','mu','cm-1','Hz']", calling = self.calling)
+                return None
+        if isinstance(unit, (list, tuple)):
+            return np.array([continuum.get_x(u) for u in units])
+        return _read_only(continuum.get_x(unit))
 
     ## Return the continuum flux (stellar or nebular, depending on cont parameter
     def get_cont_y(self, cont='incid', unit='es', dist_norm='at_earth'):
@@ -1423,32 +1978,37 @@ class CloudyModel(object):
                            'phsc' for photons/s/cm2,
                            'phsmuc' for photons/s/micron/cm2]
             dist_norm : one of ['at_earth', 'r_out', a float for a distance in cm]
+            cont and unit can also be lists: an array of shape (n_cont, n_unit, n_energies) is then returned,
+                without the axis of cont or unit if it is not a list.
         return:
             continuum flux or intensity
         """
-
-        """ First define which of the 6 continua will be return """
-        if cont == 'incid':
-            cont1 = self._res['cont']['incident'].copy()
-        elif cont == 'trans':
-            cont1 = self._res['cont']['trans'].copy()
-        elif cont == 'diffout':
-            cont1 = self._res['cont']['DiffOut'].copy()
-        elif cont == 'ntrans':
-            cont1 = self._res['cont']['net_trans'].copy()
-        elif cont == 'reflec':
-            cont1 = self._res['cont']['reflc'].copy()
-        elif cont == 'total':
-            cont1 = self._res['cont']['total'].copy()
-        else:
-            self.log_.warn("cont must be one of: ['incid','trans','diffout','ntrans','reflec', 'total']", calling = self.calling)
-            cont1 = None
+        continuum = self._get_continuum()
+        if continuum is None:
+            return None
+        conts = cont if isinstance(cont, (list, tuple)) else [cont]
+        units = unit if isinstance(unit, (list, tuple)) else [unit]
+        for c in conts:
+            if c not in _CONT_KEYS:
+                self.log_.warn("cont must be one of: ['incid','trans','diffout','ntrans','reflec', 'total']",
+                               calling = self.calling)
+                return None
+        for u in units:
+            if u not in _CONT_Y_UNITS:
+                self.log_.warn("unit must be one of: ['esc', 'ec3','es','esA','esAc','esHzc','WmHz','Wcmu','Jy','Q']",
+                               calling = self.calling)
+                return None
+        if 'Q' in units and not pc.config.INSTALLED['scipy']:
+            self.log_.warn('Scipy not found to integrate Q', calling = self.calling)
+            return None
 
         inner_surface = 4. * np.pi * self.r_in ** 2.
         if int(self.cloudy_version_major) >= 17:
-            cont1 /= inner_surface
-        """ Define the continuum depending on the unit """
-        if unit not in ('es', 'esA', 'esHz', 'Q', 'phs', 'phsmu'):
+            norm = 1. / inner_surface
+        else:
+            norm = 1.
+        """ Define the normalisation depending on the unit """
+        if any(_CONT_Y_UNITS[u][2] for u in units):
             if self.distance is not None:
                 if dist_norm == 'at_earth':
                     dist_fact = (self.r_in / (self.distance * pc.CST.KPC)) ** 2.
@@ -1462,70 +2022,20 @@ class CloudyModel(object):
             else:
                 self.log_.error('No distance set to compute cont_y', calling = self.calling)
 
-        if unit == 'es':
-            """ erg.s-1 """
-            to_return = cont1 * inner_surface
-        elif unit == 'esA':
-            """erg.s-1.A-1"""
-            to_return = cont1 / self.get_cont_x(unit='Ang') * inner_surface
-        elif unit == 'esHz':
-            """erg.s-1.Hz-1"""
-            to_return = cont1 / self.get_cont_x(unit='Hz') * inner_surface
-        elif unit == 'esc':
-            """ erg.s-1.cm-2 """
-            to_return = cont1 * dist_fact
-        elif unit == 'ec3':
-            """ erg.s-1.cm-2.c-1 """
-            to_return = cont1 * dist_fact / pc.CST.CLIGHT
-        elif unit == 'ec3A':
-            """ erg.s-1.cm-2.A-1.c-1 """
-            to_return = cont1 / self.get_cont_x(unit='Ang') * dist_fact / pc.CST.CLIGHT
-        elif unit == 'esAc':
-            """ erg.s-1.cm-2.A-1 """
-            to_return = cont1 / self.get_cont_x(unit='Ang') * dist_fact
-        elif unit == 'esHzc':
-            """ erg.s-1.cm-2.Hz-1 """
-            to_return = cont1 / self.get_cont_x(unit='Hz') * dist_fact
-        elif unit == 'WmHz':
-            """Watt.m-2.Hz-1"""
-            to_return = 1e-3 * cont1 / self.get_cont_x(unit='Hz') * dist_fact
-        elif unit == 'Wcmu':
-            """Watt.cm-2.microns-1"""
-            to_return = 1e-7 * cont1 / self.get_cont_x(unit='mu') * dist_fact
-        elif unit == 'WmA':
-            """Watt.m-2.Angstrom-1"""
-            to_return = 1e-3 * cont1 / self.get_cont_x(unit='Ang') * dist_fact
-        elif unit == 'Jy':
-            to_return = 1e23 * cont1 / self.get_cont_x(unit='Hz') * dist_fact
-        elif unit == 'Q':
+        i_conts = [_CONT_KEYS.index(c) for c in conts]
+        factors = np.array([continuum.get_unit_factor(u) * (norm * (dist_fact if _CONT_Y_UNITS[u][2] else inner_surface))
+                            for u in units])
+        to_return = np.array([continuum.y[i] for i in i_conts])[:, np.newaxis, :] * factors
+        if 'Q' in units:
             """ Number of photons emitted per second above the energy hnu"""
-            if pc.config.INSTALLED['scipy']:
-                x = self.get_cont_x(unit='Ryd')
-                y = cont1 / (x ** 2 * pc.CST.ECHARGE * 1e7 * pc.CST.RYD_EV) * inner_surface
-                int_cum = np.zeros_like(y)
-                int_cum[0:-1] = -1. * cumtrapz(y[::-1], x[::-1])[::-1]
-                to_return = int_cum
-            else:
-                self.log_.warn('Scipy not found to integrate Q', calling = self.calling)
-                to_return = None
-        elif unit == 'phs':
-            """photons.s-1"""
-            to_return = cont1 / (self.get_cont_x(unit='Ryd') * pc.CST.ECHARGE * 1e7 * pc.CST.RYD_EV) * inner_surface
-        elif unit == 'phsmu':
-            """photons.s-1.micron-1"""
-            to_return = cont1 / (self.get_cont_x(unit='mu') * self.get_cont_x(unit='Ryd') *
-                                 pc.CST.ECHARGE * 1e7 * pc.CST.RYD_EV) * inner_surface
-        elif unit == 'phsc':
-            """photons.s-1.cm-2"""
-            to_return = cont1 / (self.get_cont_x(unit='Ryd') * pc.CST.ECHARGE * 1e7 * pc.CST.RYD_EV) * dist_fact
-        elif unit == 'phsmuc':
-            """photons.s-1.cm-2.micron"""
-            to_return = cont1 / (self.get_cont_x(unit='mu') * self.get_cont_x(unit='Ryd') *
-                                 pc.CST.ECHARGE * 1e7 * pc.CST.RYD_EV) * dist_fact
-        else:
-            self.log_.warn("unit must be one of: ['esc', 'ec3','es','esA','esAc','esHzc','WmHz','Wcmu','Jy','Q']",
-                            calling = self.calling)
-            to_return = None
+            Q = continuum.get_Q(i_conts) * (norm * inner_surface)
+            for i, u in enumerate(units):
+                if u == 'Q':
+                    to_return[:, i] = Q
+        if not isinstance(unit, (list, tuple)):
+            to_return = to_return[:, 0]
+        if not isinstance(cont, (list, tuple)):
+            to_return = to_return[0]
         return to_return
 
     def get_integ_spec(self, cont, lam_low, lam_high, unit='es'):
@@ -1555,6 +2065,47 @@ class CloudyModel(object):
         integ = mytrapz(self.get_cont_y(cont=cont, unit=unity), self.get_cont_x(unitx), lam_low, lam_high)
         return integ
 
+    def get_band_integ(self, filters, cont='ntrans', unit='esA', dist_norm='at_earth', mean=False):
+        """
+        Return the integrals of the continuum over the bands of a FilterBank, all at once.
+        param:
+            filters [FilterBank] bands, in the x unit filters.x_unit
+            cont, unit, dist_norm: see get_cont_y. unit must be per filters.x_unit (e.g. 'esA' for 'Ang').
+                cont can be a list, an array of shape (n_cont, n_bands) is then returned.
+            mean [boolean] if True, the mean value of the continuum in each band is returned instead of the integral
+        example:
+            FB = pc.FilterBank()
+            FB.add_top_hat('5000-6000', 5000, 6000)
+            M.get_band_integ(FB, 'diffout') # same as M.get_integ_spec('diffout', 5000, 6000)
+        """
+        x = self.get_cont_x(unit=filters.x_unit)
+        y = self.get_cont_y(cont=cont, unit=unit, dist_norm=dist_norm)
+        if x is None or y is None:
+            return None
+        if mean:
+            return filters.get_mean(x, y)
+        return filters.integrate(x, y)
+
+    def get_Q_above(self, E, unit='eV', cont='incid'):
+        """
+        Return the number of photons emitted per second above the energies E (get_cont_y with unit='Q',
+        interpolated at E). The cumulative integral is computed once per continuum.
+        param:
+            E [float or array] energies, wavelengths or frequencies
+            unit [str] unit of E, one of the units of get_cont_x
+            cont [str] continuum, see get_cont_y
+        return:
+            Q(>E), with the shape of E. Beyond the limits of the continuum, the values at the limits.
+        """
+        x = self.get_cont_x(unit=unit)
+        Q = self.get_cont_y(cont=cont, unit='Q')
+        if x is None or Q is None:
+            return None
+        if x[0] > x[-1]:
+            x = x[::-1]
+            Q = Q[::-1]
+        return np.interp(E, x, Q)
+
     def get_interp_cont(self, cont='incid', unit='es', dist_norm='at_earth',
                         x_value=4686.0, x_unit='Ang'):
         """
@@ -1603,6 +2154,7 @@ class CloudyModel(object):
         return self.__depth_out_cut
 
     def _set_depth_out_cut(self, value):
+        self._r_range_cache = None
         if self.n_zones_full > 1:
             if value >= self.depth_in:
                 self.__depth_out_cut = value
@@ -1642,6 +2194,7 @@ class CloudyModel(object):
         return self.__depth_in_cut
 
     def _set_depth_in_cut(self, value):
+        self._r_range_cache = None
         if self.n_zones_full > 1:
             if value >= self.depth_in:
                 self.__depth_in_cut = value
@@ -1664,12 +2217,36 @@ class CloudyModel(object):
         """ boolean array. True for r_in_cut < radius < r_out_cut, False elsewhere.
         Used in most of the parameter calls such as te, get_emis, get_ionic, etc"""
         if self.n_zones_full > 1:
-#           self.__r_range = (self.radius_full <= self.r_out_cut) & (self.radius_full >= self.r_in_cut)
-            self.__r_range = (self.depth_full <= self.depth_out_cut) & (self.depth_full >= self.depth_in_cut)
-            return self.__r_range
+            return self._get_r_range_cache()['mask']
+        elif self.n_zones_full == 1:
+            return 0
+
+    @property
+    def _r_index(self):
+        """ Same as r_range, but a slice when the zones in the range are contiguous, giving views on the arrays """
+        if self.n_zones_full > 1:
+            return self._get_r_range_cache()['index']
         elif self.n_zones_full == 1:
             return 0
 
+    def _get_r_range_cache(self):
+        """
+        Return the dictionary holding r_range, the corresponding index and the quantities computed on r_range
+        (dvff, drff, ...). It is reset when depth_in_cut or depth_out_cut (and then all the *_cut) are set.
+        """
+        if self._r_range_cache is None:
+#           r_range = (self.radius_full <= self.r_out_cut) & (self.radius_full >= self.r_in_cut)
+            r_range = _read_only((self.depth_full <= self.depth_out_cut) & (self.depth_full >= self.depth_in_cut))
+            zones = np.flatnonzero(r_range)
+            if zones.size == 0:
+                index = slice(0, 0)
+            elif zones[-1] - zones[0] + 1 == zones.size:
+                index = slice(zones[0], zones[-1] + 1)
+            else:
+                index = zones
+            self._r_range_cache = {'mask': r_range, 'index': index, 'n_zones': zones.size}
+        return self._r_range_cache
+
     def _get_H_mass_cut(self):
         return self.__H_mass_cut
 
@@ -1809,15 +2386,60 @@ class CloudyModel(object):
                 res += self.get_EW(lab, lam0, lam_inf, lam_sup)
                 return res
         if label in self.emis_labels:
-            mask_low = (self.get_cont_x('Ang') < lam0) & (self.get_cont_x('Ang') > lam_inf)
-            I_low = np.min(self.get_cont_y('ntrans', 'esA')[mask_low])
-            mask_high = (self.get_cont_x('Ang') > lam0) & (self.get_cont_x('Ang') < lam_sup)
-            I_high = np.min(self.get_cont_y('ntrans', 'esA')[mask_high])
-            return -self.get_emis_vol(label) / np.mean((I_low, I_high))
+            return -self.get_emis_vol(label) / self._get_EW_cont([lam0], [lam_inf], [lam_sup])[0]
         else:
             self.log_.warn('{} line not in emis file'.format(label), calling = self.calling + '.get_EW')
         return None
 
+    def get_EWs(self, labels, lam0s, lam_infs=None, lam_sups=None):
+        """
+        Equivalent Widths of many lines at once, computed as in get_EW.
+        param:
+            labels [list of str] line labels
+            lam0s [float or array] wavelengths of the lines (Angstrom)
+            lam_infs, lam_sups [float or array] limits of the windows where the continuum is estimated,
+                default: lam0s - 300 and lam0s + 300
+        return:
+            [float array] EWs of the lines, NaN for lines not in the emis file or empty windows
+        """
+        if self.emis_full is None:
+            self.log_.error('No emissivities to compute the EWs', calling = self.calling + '.get_EWs')
+        lam0s = np.broadcast_to(np.asarray(lam0s, dtype=float), (len(labels),))
+        if lam_infs is None:
+            lam_infs = lam0s - 300.
+        if lam_sups is None:
+            lam_sups = lam0s + 300.
+        lam_infs = np.broadcast_to(np.asarray(lam_infs, dtype=float), lam0s.shape)
+        lam_sups = np.broadcast_to(np.asarray(lam_sups, dtype=float), lam0s.shape)
+        cont = self._get_EW_cont(lam0s, lam_infs, lam_sups)
+        emis_index = self._get_emis_index()
+        i_emis = np.array([emis_index.get(label, -1) for label in labels], dtype=int)
+        for label in np.asarray(labels)[i_emis < 0]:
+            self.log_.warn('{} line not in emis file'.format(label), calling = self.calling + '.get_EWs')
+        emis = np.where(i_emis >= 0, self.get_emis_vol_all()[i_emis], np.nan)
+        return -emis / cont
+
+    def _get_EW_cont(self, lam0s, lam_infs, lam_sups):
+        """
+        Continuum at lam0s used by get_EW and get_EWs: mean of the minima of the net transmitted continuum
+        between lam_infs and lam0s and between lam0s and lam_sups (NaN if a window is empty).
+        """
+        lam = self.get_cont_x('Ang')
+        cont = self.get_cont_y('ntrans', 'esA')
+        if lam[0] > lam[-1]:
+            lam = lam[::-1]
+            cont = cont[::-1]
+        # windows lam_inf < lam < lam0 and lam0 < lam < lam_sup
+        starts = np.concatenate((np.searchsorted(lam, lam_infs, side='right'),
+                                 np.searchsorted(lam, lam0s, side='right')))
+        ends = np.concatenate((np.searchsorted(lam, lam0s, side='left'),
+                               np.searchsorted(lam, lam_sups, side='left')))
+        # minimum of each window with one reduceat, the segments between the windows are ignored
+        mins = np.minimum.reduceat(np.append(cont, np.inf), np.ravel(np.column_stack((starts, ends))))[::2]
+        mins[ends <= starts] = np.nan
+        I_low, I_high = mins.reshape(2, -1)
+        return (I_low + I_high) / 2.
+
     def get_EW2(self, label, lam0, lam_inf, lam_sup, plot=False):
         """
         Equivalent Width:
@@ -1832,14 +2454,16 @@ class CloudyModel(object):
                 res += self.get_EW2(lab, lam0, lam_inf, lam_sup)
                 return res
         if label in self.emis_labels:
-            mask_low = (self.get_cont_x('Ang') < lam0*0.99) & (self.get_cont_x('Ang') > lam_inf)
-            mask_high = (self.get_cont_x('Ang') > lam0*1.01) & (self.get_cont_x('Ang') < lam_sup)
+            lam = self.get_cont_x('Ang')
+            cont = self.get_cont_y('ntrans', 'esA')
+            mask_low = (lam < lam0*0.99) & (lam > lam_inf)
+            mask_high = (lam > lam0*1.01) & (lam < lam_sup)
             mask = mask_low | mask_high
-            fit = np.polyfit(self.get_cont_x('Ang')[mask], self.get_cont_y('ntrans', 'esA')[mask], deg=1)
+            fit = np.polyfit(lam[mask], cont[mask], deg=1)
             if plot:
                 f, ax = plt.subplots()
-                ax.plot(self.get_cont_x('Ang'), self.get_cont_y('ntrans', 'esA'))
-                ax.plot(self.get_cont_x('Ang'), np.polyval(fit, self.get_cont_x('Ang')))
+                ax.plot(lam, cont)
+                ax.plot(lam, np.polyval(fit, lam))
                 ax.set_xlim((lam_inf, lam_sup))
             return -self.get_emis_vol(label) / np.polyval(fit, lam0)
         else:
@@ -1881,7 +2505,7 @@ class CloudyModel(object):
             [boolean] True if elem,ion has value for get_ionic(elem, ion)
         """
         to_return = False
-        if elem in list(self.ionic_names.keys()):
+        if elem in self.ionic_names:
             if (ion >= 0) & (ion < self.n_ions[elem]):
                 to_return = True
         return to_return
@@ -1918,7 +2542,11 @@ class CloudyModel(object):
                     if self.is_valid_ion(elem, spec - 1) and atoms[ion] is not None:
                         emis = atoms[ion].getEmissivity(self.te_full, self.ne_full, wave = wave, product = False) * \
                             self.ionic_full[elem][spec - 1] * self.ne_full * self.nH_full * 10**self.abund[elem]
+                        if not self.emis_full.flags.writeable:
+                            # memory-mapped emissivities
+                            self.emis_full = np.array(self.emis_full)
                         self.emis_full[self._i_emis(line)] = emis
+                        self.reset_cumul_cache()
                         pc.log_.message('emissivity for {0} changed from PyNeb'.format(line), calling = self.calling)
                     else:
                         pc.log_.warn('ion {0} not in Cloudy outputs'.format(ion), calling = self.calling)
@@ -1939,7 +2567,7 @@ class CloudyModel(object):
 
         """
 
-        new_emis_full = np.zeros((len(self.emis_labels)+1, self.n_zones_full))
+        new_emis_full = np.zeros((len(self.emis_labels)+1, self.n_zones_full), dtype=self.emis_full.dtype)
         new_emis_full[:-1, :] = self.emis_full
         if type(pyneb_atom) is pyneb.RecAtom:
             spec = pyneb_atom.spec
@@ -1969,12 +2597,13 @@ class CloudyModel(object):
             self.emis_labels_17 = self.emis_labels
         else:
             self.emis_labels_13 = self.emis_labels
+        self._set_emis_index()
 
     def copy_line(self, new_label, old_label):
 
         if old_label not in self.emis_labels:
             self.log_.error(f'Can not find {old_label} in label list', calling="copy_line")
-        new_emis_full = np.zeros((len(self.emis_labels)+1, self.n_zones_full))
+        new_emis_full = np.zeros((len(self.emis_labels)+1, self.n_zones_full), dtype=self.emis_full.dtype)
         new_emis_full[:-1, :] = self.emis_full
         new_emis_full[-1, :] = self.emis_full[self._i_emis(old_label)]
 
@@ -1986,6 +2615,7 @@ class CloudyModel(object):
             self.emis_labels_17 = self.emis_labels
         else:
             self.emis_labels_13 = self.emis_labels
+        self._set_emis_index()
 
     def plot_spectrum(self, xunit='eV', cont='ntrans', yunit='es', ax=None,
                       xlog=True, ylog=True, **kargv):
@@ -2105,7 +2735,8 @@ class CloudyModel(object):
         return "{0.info}".format(self)
 
 ## @include copyright.txt
-def load_models(model_name = None, mod_list = None, n_sample = None, verbose = False, **kwargs):
+def load_models(model_name = None, mod_list = None, n_sample = None, verbose = False, n_procs = 1, executor = None,
+                **kwargs):
     """
     Return a list of CloudyModel correspondig to a generic name
 
@@ -2114,9 +2745,41 @@ def load_models(model_name = None, mod_list = None, n_sample = None, verbose = F
         - mod_list:    in case model_name=None, this is the list of model names (something.out or something)
         - n_sample:    randomly select n_sample from the model list
         - verbose:    print out the name of the models read
-        - **kwargs:    arguments passed to CloudyModel
+        - n_procs:    number of processes used to read the models in parallel (default 1: sequential reading)
+        - executor:    a concurrent.futures.Executor (e.g. a ProcessPoolExecutor reused between calls)
+                        used to read the models. Overrides n_procs.
+                        The models are returned in the order of the list, whatever the executor.
+        - **kwargs:    arguments passed to CloudyModel (e.g. dtype=np.float32 to reduce the memory used by the models)
+    See also iter_models, to process the models one at a time without keeping them all in memory.
+    """
+    mod_list = _get_mod_list(model_name, mod_list, n_sample)
+    if mod_list is None:
+        return None
+    m = list(_iter_models(mod_list, verbose, n_procs, executor, len(mod_list), kwargs))
+    pc.log_.message('{0} models read'.format(np.size(mod_list)), calling = 'load_models')
+    return m
+
+def iter_models(model_name = None, mod_list = None, n_sample = None, verbose = False, n_procs = 1, executor = None,
+                prefetch = None, **kwargs):
     """
+    Generator yielding the CloudyModel correspondig to a generic name one at a time,
+    in the order of the list. Only the models being yielded or read in advance are kept in memory.
+    ex: Hbetas = [M.Hbeta for M in iter_models('models/M', n_procs=4)]
 
+    Parameters:
+        - model_name, mod_list, n_sample, verbose, n_procs, executor, **kwargs:    as in load_models
+        - prefetch:    maximum number of models read in advance when n_procs > 1 or an executor is used
+                        (default 2 * n_procs). Set it to about twice the number of workers of the executor.
+    """
+    mod_list = _get_mod_list(model_name, mod_list, n_sample)
+    if mod_list is None:
+        return
+    if prefetch is None:
+        prefetch = 2 * n_procs
+    for cm in _iter_models(mod_list, verbose, n_procs, executor, prefetch, kwargs):
+        yield cm
+
+def _get_mod_list(model_name, mod_list, n_sample):
     if model_name is not None:
         mod_list = glob.glob(model_name + '*.out')
     if mod_list is None or mod_list == []:
@@ -2128,26 +2791,495 @@ def load_models(model_name = None, mod_list = None, n_sample = None, verbose = F
                           calling = 'load models')
             return None
         mod_list = random.sample(mod_list, n_sample)
-    m = []
+    return mod_list
+
+def _iter_models(mod_list, verbose, n_procs, executor, prefetch, kwargs):
+    model_names = []
     for outfile in mod_list:
         if outfile[-4::] == '.out':
-            model_name = outfile[0:-4]
+            model_names.append(outfile[0:-4])
+        else:
+            model_names.append(outfile)
+    own_pool = None
+    if executor is None and n_procs > 1 and len(model_names) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = own_pool = ProcessPoolExecutor(max_workers=n_procs)
+    futures = deque()
+    try:
+        if executor is None:
+            results = (_load_model(name, kwargs) for name in model_names)
         else:
-            model_name = outfile
-        try:
-            cm = CloudyModel(model_name, **kwargs)
-            if cm.aborted:
-                if verbose:
-                    print('{0} model aborted'.format(outfile[0:-4]))
-            else:
-                m.append(cm)
-                if verbose:
-                    print('{0} model read'.format(outfile[0:-4]))
-        except:
+            results = _iter_futures(executor, model_names, kwargs, prefetch, futures)
+        for outfile, (status, cm) in zip(mod_list, results):
             if verbose:
-                print('{0} model NOT read'.format(outfile[0:-4]))
-    pc.log_.message('{0} models read'.format(np.size(mod_list)), calling = 'load_models')
-    return m
+                print('{0} model {1}'.format(outfile[0:-4], status))
+            if status == 'read':
+                yield cm
+    finally:
+        # the iteration may have been stopped before the end
+        for future in futures:
+            future.cancel()
+        if own_pool is not None:
+            own_pool.shutdown()
+
+def _iter_futures(executor, model_names, kwargs, prefetch, futures):
+    """ Submit the reading of the models to the executor, with at most prefetch of them pending """
+    names = iter(model_names)
+    for name in names:
+        futures.append(executor.submit(_load_model, name, kwargs))
+        if len(futures) >= max(prefetch, 1):
+            break
+    while futures:
+        result = futures.popleft().result()
+        for name in names:
+            futures.append(executor.submit(_load_model, name, kwargs))
+            break
+        yield result
+
+def _load_model(model_name, kwargs):
+    """
+    Read a model for load_models (may be run in another process).
+    Return (status, model), status being 'read', 'aborted' or 'NOT read' (model is then None)
+    """
+    try:
+        cm = CloudyModel(model_name, **kwargs)
+        if cm.aborted:
+            return 'aborted', None
+        return 'read', cm
+    except:
+        return 'NOT read', None
+
+def _same_arrays(a, b):
+    """ True if a and b are the same array, or tuples of the same arrays """
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return len(a) == len(b) and all(x is y for x, y in zip(a, b))
+    return a is b
+
+def _read_only(array):
+    """ Return a read-only view of the array (or the value itself if it is not an array) """
+    if isinstance(array, np.ndarray):
+        array = array.view()
+        array.flags.writeable = False
+    return array
+
+def _label_index(labels_13, labels_17):
+    """
+    Return a dictionary giving the index of each label. The first occurrence of a label is used,
+    the c13 labels have priority over the c17 ones.
+    """
+    index = {label: i for i, label in reversed(list(enumerate(labels_17)))}
+    index.update({label: i for i, label in reversed(list(enumerate(labels_13)))})
+    return index
+
+## Extensions of the save files that are not regular tables (strings in the columns),
+# directly read with np.genfromtxt
+_GENFROMTXT_EXT = ('heat', 'cool')
+
+# Attributes defined by the CloudyModel._init_* methods, read when first used in lazy mode
+_HBETA_LABELS = ('H__1__4861A', 'H__1_486133A', 'H__1_486132A', 'H__1_486136A')
+
+_LAZY_ATTRS = {'_init_rad': ('n_zones_full', 'zones_full', 'depth_full', 'thickness_full', 'radius_full', 'dr_full',
+                             'dv_full', 'r_in', 'r_out', 'depth_in', 'depth_out', 'empty_model',
+                             '_CloudyModel__depth_in_cut', '_CloudyModel__depth_out_cut',
+                             '_CloudyModel__r_in_cut', '_CloudyModel__r_out_cut'),
+               '_init_phy': ('ne_full', 'nH_full', 'nenH_full', 'te_full', 'tenenH_full', 'ff_full', 'nenHff2_full',
+                             'nHff_full', 'H_mass_full', '_CloudyModel__H_mass_cut'),
+               '_init_ovr': ('AV_point_full', 'AV_extend_full', 'Tau912_full'),
+               '_init_lin': ('line_labels', 'line_labels_13', 'line_labels_17', 'n_lines', 'lines', 'slines',
+                             'rlines'),
+               '_init_emis': ('emis_labels', 'emis_labels_13', 'emis_labels_17', 'n_emis', 'emis_full',
+                              'Hbeta_label', 'Hbeta_full', '_CloudyModel__Hbeta_cut'),
+               '_init_cont': (),
+               '_init_opd': ('opd_energy', 'opd_total', 'opd_absorp', 'opd_scat'),
+               '_init_heatcool': ('heat_full', 'cool_full'),
+               '_init_abunds': ('abunds_full',),
+               '_init_pressure': ('pressure_full',),
+               '_init_grains': ('gtemp_labels', 'n_gtemp', 'gtemp_full', 'gsize', 'gabund_labels', 'n_gabund',
+                                'gabund_full', 'gasize', 'gdgrat_labels', 'n_gdgrat', 'gdgrat_full', 'gdsize')}
+# Keys of CloudyModel._res defined by the same methods
+_LAZY_RES = {'_init_rad': ('rad',), '_init_phy': ('phy',), '_init_ovr': ('ovr',), '_init_lin': ('lin',),
+             '_init_emis': ('emis',), '_init_cont': ('cont',), '_init_opd': ('opd',), '_init_heatcool': ('heat',),
+             '_init_abunds': ('abunds',), '_init_pressure': ('pres',),
+             '_init_grains': ('gtemp', 'gabund', 'gdgrat')}
+
+class _LazyDict(dict):
+    """
+    Dictionary used by CloudyModel in lazy mode. The pending keys are read by the model when first used.
+    """
+    def __init__(self, model):
+        dict.__init__(self)
+        self.model = model
+        self.pending = {}
+        self.order = None
+
+    def _load(self, key):
+        self.model._lazy_load(self.pending[key])
+
+    def load_all(self):
+        """ Read all the pending keys and sort the dictionary as if it was read at once """
+        while self.pending:
+            self._load(next(iter(self.pending)))
+        if self.order is not None:
+            items = [(key, dict.pop(self, key)) for key in self.order if dict.__contains__(self, key)]
+            items += list(dict.items(self))
+            dict.clear(self)
+            dict.update(self, items)
+            self.order = None
+
+    def __missing__(self, key):
+        if key in self.pending:
+            self._load(key)
+            if dict.__contains__(self, key):
+                return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self.pending:
+            self._load(key)
+        return dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __iter__(self):
+        self.load_all()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.load_all()
+        return dict.__len__(self)
+
+    def keys(self):
+        self.load_all()
+        return dict.keys(self)
+
+    def values(self):
+        self.load_all()
+        return dict.values(self)
+
+    def items(self):
+        self.load_all()
+        return dict.items(self)
+
+    def __repr__(self):
+        self.load_all()
+        return dict.__repr__(self)
+
+# Lines of the .out file used by CloudyModel._read_stout, in order of priority:
+# (substring, True if the line must start with the substring, what to do with the line).
+# The last item is a key of CloudyModel.out, the name of a list attribute of CloudyModel,
+# or one of version, Chem, GrainChem, SED, Blackbody and distance which need more work.
+_STOUT_DISPATCH = (('Cloudy', False, 'version'),
+                   (' ####  1', True, '###First'),
+                   (' ###', True, '###Last'),
+                   ('Calculation stopped', False, 'stop'),
+                   ('Cloudy ends', False, 'Cloudy ends'),
+                   ('something went wrong', False, 'wrong'),
+                   ('Gas Phase Chemical Composition', False, 'Chem'),
+                   ('Grain Chemical Composition', False, 'GrainChem'),
+                   ('Dust to gas ratio', False, 'D/G'),
+                   ('* grains', False, 'grains'),
+                   ('iterate', False, 'iterate'),
+                   ('Hi-Con', False, 'SED'),
+                   ('table star', False, 'table star'),
+                   ('table SED', False, 'table SED'),
+                   ('Blackbody', False, 'Blackbody'),
+                   ('hden', False, 'hden'),
+                   ('dlaw', False, 'dlaw'),
+                   ('TOTL  4861A', False, 'Hbeta'),
+                   ('H  1      4861.36A', False, 'Hbeta'),
+                   ('H  1      4861.33A', False, 'Hbeta'),
+                   ('luminosity', False, 'luminosity'),
+                   ('turbulence', False, 'turbulence'),
+                   ('fudge', False, 'fudge'),
+                   ('distance', False, 'distance'),
+                   ('#C3D', False, 'C3D_comments'),
+                   ('# **', False, 'comments'),
+                   (' C-', True, 'cautions'),
+                   ('  !', True, 'warnings'),
+                   (' W-', True, 'warnings'))
+_STOUT_BLOCK_SIZE = 2**22
+
+def _make_stout_regexps(anchors='\n#bdi4'):
+    """
+    Return regular expressions finding (at least) all the substrings of _STOUT_DISPATCH.
+    The re module is only fast when the pattern starts with a single literal character, so the substrings
+    are grouped by an anchor character they contain, each pattern looking for the end of the substrings
+    starting at this character. The ones to be found at the start of a line are preceded by a new line.
+    """
+    groups = {}
+    for sub, at_start, key in _STOUT_DISPATCH:
+        if at_start:
+            sub = '\n' + sub
+        for anchor in anchors:
+            i = sub.find(anchor)
+            if i != -1 and i < len(sub) - 1:
+                break
+        else:
+            i = 0
+        groups.setdefault(sub[i], set()).add(sub[i + 1:])
+    return [re.compile(re.escape(anchor) + '(?:' + '|'.join(re.escape(end) for end in sorted(ends)) + ')')
+            for anchor, ends in groups.items()]
+_STOUT_REGEXPS = _make_stout_regexps()
+
+def _find_lines(text):
+    """
+    Return the sorted positions of the starts of the lines of text containing one of the substrings of _STOUT_DISPATCH.
+    Some other lines may be included.
+    """
+    line_starts = set()
+    for sub, at_start, key in _STOUT_DISPATCH:
+        if at_start and text.startswith(sub):
+            line_starts.add(0)
+    for regexp in _STOUT_REGEXPS:
+        for match in regexp.finditer(text):
+            line_starts.add(text.rfind('\n', 0, match.end()) + 1)
+    return sorted(line_starts)
+
+# Attributes defined by CloudyModel._read_stout, stored in the cache
+_STOUT_ATTRS = ('out', 'C3D_comments', 'comments', 'warnings', 'cautions', 'out_exists', 'info', 'date_model',
+                'Teff', 'cloudy_version', 'cloudy_version_major', 'distance', 'emis_is_log', 'theta', 'phi',
+                'Q', 'Q0', 'Phi', 'Phi0', 'plan_par', 'abund', 'gas_mass_per_H', 'aborted')
+
+class _OutputsCache(object):
+    """
+    On-disk store of a Cloudy model, next to the model in the model_name.cache directory: the parsed outputs
+    (use_cache) and the arrays converted from them (emissivities, ionic fractions, continuum, for use_mmap),
+    one .npy file per array, and manifest.json. Each entry is keyed on the modification time and size
+    of the Cloudy file it comes from, and on the arguments used to read or convert it. Stale entries are
+    ignored, re-read and replaced. Adding an array writes only its file, the manifest is written by save.
+    The converted arrays are returned as read-only memory-mapped arrays.
+    """
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.dir_name = model_name + '.cache'
+        self.manifest_name = os.path.join(self.dir_name, 'manifest.json')
+        self.manifest = self._read_manifest(warn=True)
+        ## keys of the entries changed since the manifest was read
+        self.modified = set()
+
+    def _read_manifest(self, warn=False):
+        if not os.path.exists(self.manifest_name):
+            return {}
+        try:
+            with open(self.manifest_name) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            if warn:
+                pc.log_.warn('Cache file {0} not readable, ignored'.format(self.manifest_name),
+                             calling='CloudyModel cache')
+            return {}
+
+    def _stat(self, extension):
+        return _file_stat(self.model_name + '.' + extension)
+
+    def _array_name(self, key):
+        return os.path.join(self.dir_name, key + '.npy')
+
+    def _get_entry(self, key, extension, args):
+        """ Return the entry of the manifest if it is valid, None otherwise """
+        entry = self.manifest.get(key)
+        if entry is None or entry['args'] != args or entry['stat'] != self._stat(extension):
+            return None
+        return entry
+
+    def _put_entry(self, key, extension, args, **kwargs):
+        self.manifest[key] = dict(args=args, stat=self._stat(extension), **kwargs)
+        self.modified.add(key)
+
+    def _write_array(self, key, array):
+        """ Write the array in its .npy file through a temporary file. Return False if it cannot be written """
+        file_name = self._array_name(key)
+        tmp_name = file_name + '.tmp{0}'.format(os.getpid())
+        try:
+            os.makedirs(self.dir_name, exist_ok=True)
+            with open(tmp_name, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_name, file_name)
+            return True
+        except OSError:
+            pc.log_.warn('Unable to write {0} in {1}'.format(key, self.dir_name), calling='CloudyModel cache')
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            return False
+
+    def get_stout(self, args):
+        """ Return the dictionary of attributes defined by _read_stout, or None if not valid """
+        entry = self._get_entry('out', 'out', args)
+        if entry is None:
+            return None
+        return _json2attrs(entry['attrs'])
+
+    def put_stout(self, args, attrs):
+        self._put_entry('out', 'out', args, attrs=_attrs2json(attrs))
+
+    def get(self, extension, args):
+        """ Return (True, array) if the parsed extension is in the cache, (False, None) otherwise """
+        key = 'ext_' + extension
+        entry = self._get_entry(key, extension, args)
+        if entry is None:
+            return False, None
+        if not entry['is_array']:
+            return True, None
+        try:
+            return True, np.load(self._array_name(key))
+        except (OSError, ValueError):
+            return False, None
+
+    def put(self, extension, args, array):
+        """ Write the parsed array of the extension """
+        key = 'ext_' + extension
+        if array is None or self._write_array(key, array):
+            self._put_entry(key, extension, args, is_array=array is not None)
+
+    def get_array(self, name, extension, args=None):
+        """
+        Return (memory-mapped array, names) of an array converted from the extension,
+        or (None, None) if it is not in the store or not valid anymore.
+        """
+        key = 'mmap_' + name
+        entry = self._get_entry(key, extension, repr(args))
+        if entry is None:
+            return None, None
+        try:
+            array = np.load(self._array_name(key), mmap_mode='r')
+        except (OSError, ValueError):
+            return None, None
+        pc.log_.message('{0} memory-mapped from {1}'.format(name, self.dir_name), calling='CloudyModel cache')
+        return array, entry['names']
+
+    def put_array(self, name, extension, array, names=None, args=None):
+        """
+        Write an array converted from the extension and return it memory-mapped
+        (or unchanged if it cannot be written).
+        """
+        key = 'mmap_' + name
+        if not self._write_array(key, array):
+            return array
+        self._put_entry(key, extension, repr(args), names=names)
+        return np.load(self._array_name(key), mmap_mode='r')
+
+    def save(self):
+        """
+        Write the manifest if something changed since it was read. The entries written by other processes
+        using the same model in the meantime are kept.
+        """
+        if not self.modified:
+            return
+        manifest = self._read_manifest()
+        manifest.update({key: self.manifest[key] for key in self.modified})
+        tmp_name = self.manifest_name + '.tmp{0}'.format(os.getpid())
+        try:
+            os.makedirs(self.dir_name, exist_ok=True)
+            with open(tmp_name, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_name, self.manifest_name)
+            self.manifest = manifest
+            self.modified = set()
+            pc.log_.message('Cache saved in {0}'.format(self.dir_name), calling='CloudyModel cache')
+        except OSError:
+            pc.log_.warn('Unable to write cache file {0}'.format(self.manifest_name), calling='CloudyModel cache')
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+## Units of CloudyModel.get_cont_x: x = factor * hnu (power 1) or factor / hnu (power -1), hnu in Ryd
+_CONT_X_UNITS = {'Ryd': (1., 1),
+                 'eV': (CST.RYD_EV, 1),
+                 'Ang': (CST.RYD_ANG, -1),
+                 'mu': (CST.RYD_ANG / 1e4, -1),
+                 'cm-1': (CST.RYD, 1),
+                 'Hz': (CST.RYD * CST.CLIGHT, 1),
+                 'kHz': (CST.RYD * CST.CLIGHT / 1e3, 1),
+                 'MHz': (CST.RYD * CST.CLIGHT / 1e6, 1),
+                 'GHz': (CST.RYD * CST.CLIGHT / 1e9, 1)}
+# Energy of 1 Ryd in erg (to convert erg into photons)
+_RYD_ERG = CST.ECHARGE * 1e7 * CST.RYD_EV
+## Units of CloudyModel.get_cont_y: (factor, units of x dividing the continuum, True if normalized by the distance
+## (otherwise multiplied by the inner surface)). Q is the integral of the photons/s/Ryd above hnu.
+_CONT_Y_UNITS = {'es': (1., (), False),
+                 'esA': (1., ('Ang',), False),
+                 'esHz': (1., ('Hz',), False),
+                 'esc': (1., (), True),
+                 'ec3': (1. / CST.CLIGHT, (), True),
+                 'ec3A': (1. / CST.CLIGHT, ('Ang',), True),
+                 'esAc': (1., ('Ang',), True),
+                 'esHzc': (1., ('Hz',), True),
+                 'WmHz': (1e-3, ('Hz',), True),
+                 'Wcmu': (1e-7, ('mu',), True),
+                 'WmA': (1e-3, ('Ang',), True),
+                 'Jy': (1e23, ('Hz',), True),
+                 'Q': (1. / _RYD_ERG, ('Ryd', 'Ryd'), False),
+                 'phs': (1. / _RYD_ERG, ('Ryd',), False),
+                 'phsmu': (1. / _RYD_ERG, ('mu', 'Ryd'), False),
+                 'phsc': (1. / _RYD_ERG, ('Ryd',), True),
+                 'phsmuc': (1. / _RYD_ERG, ('mu', 'Ryd'), True)}
+# Values of the cont parameter of CloudyModel.get_cont_y and the corresponding columns of the cont file
+_CONT_KEYS = ('incid', 'trans', 'diffout', 'ntrans', 'reflec', 'total')
+_CONT_COLUMNS = ('incident', 'trans', 'DiffOut', 'net_trans', 'reflc', 'total')
+
+class _Continuum(object):
+    """
+    Continuum of a model used by CloudyModel.get_cont_x and get_cont_y: views on the energies and on the
+    6 continua of the cont array (in the dtype of the model), the x axis in each unit and the factor arrays
+    of the units (computed when first used).
+    """
+    def __init__(self, cont):
+        self.source = cont
+        names = cont.dtype.names
+        hnu_name = 'Cont_nu' if 'Cont_nu' in names else 'Cont__nu' if 'Cont__nu' in names else None
+        self.hnu = None if hnu_name is None else cont[hnu_name]
+        self.y = [cont[name] for name in _CONT_COLUMNS]
+        self._x = {}
+        self._unit_factors = {}
+        self._Q = {}
+
+    def get_x(self, unit):
+        """ Energies, wavelengths or frequencies in unit (float64) """
+        if unit not in self._x:
+            factor, power = _CONT_X_UNITS[unit]
+            hnu = self.hnu.astype(np.float64, copy=False)
+            self._x[unit] = factor * hnu if power == 1 else factor / hnu
+        return self._x[unit]
+
+    def get_unit_factor(self, unit):
+        """ Array by which the continua are multiplied to get unit (before the distance normalisation) """
+        if unit not in self._unit_factors:
+            factor, x_units, by_dist = _CONT_Y_UNITS[unit]
+            res = np.full(self.hnu.size, factor)
+            for x_unit in x_units:
+                res /= self.get_x(x_unit)
+            self._unit_factors[unit] = res
+        return self._unit_factors[unit]
+
+    def get_Q(self, i_conts):
+        """
+        Number of photons (per second and per unit of inner surface for Cloudy >= 17) above each energy,
+        for the continua of indices i_conts. The cumulative integrals are computed when first used.
+        """
+        for i in i_conts:
+            if i not in self._Q:
+                x = self.get_x('Ryd')
+                y = self.y[i] * self.get_unit_factor('Q')
+                int_cum = np.zeros_like(y)
+                int_cum[0:-1] = -1. * cumtrapz(y[::-1], x[::-1])[::-1]
+                self._Q[i] = int_cum
+        return np.array([self._Q[i] for i in i_conts])
+
+def _file_stat(file_):
+    """ [modification time, size] of the file, or None if it does not exist """
+    if os.path.exists(file_):
+        stat = os.stat(file_)
+        return [stat.st_mtime_ns, stat.st_size]
+    else:
+        return None
+
+def _attrs2json(attrs):
+    return {key: {'ndarray': value.tolist()} if isinstance(value, np.ndarray) else value
+            for key, value in attrs.items()}
+
+def _json2attrs(attrs):
+    return {key: np.array(value['ndarray']) if isinstance(value, dict) and 'ndarray' in value else value
+            for key, value in attrs.items()}
 
 ## @include copyright.txt
 
@@ -0,0 +1,651 @@
+import os
+import glob
+import json
+import time
+import numpy as np
+import pyCloudy as pc
+from functools import partial
+from .cloudy_model import iter_models, _file_stat, _get_mod_list, _load_model
+from ..utils.misc import quiet_divide, rebin_trapz
+
+## Scalar properties of CloudyModel stored by ModelSet
+MODEL_SET_PROPERTIES = ('n_zones', 'r_in', 'r_out', 'Teff', 'Q0', 'Phi0', 'T0', 't2', 'H_mass', 'Hp_mass', 'Hbeta',
+                        'ColDens', 'nH_mean', 'log_U_mean', 'log_U_mean_ne')
+
+## @include copyright.txt
+class ModelSet(object):
+    """
+    Columnar container of the scalar outputs of many CloudyModel: each quantity is a numpy array
+    with one value per model. Stored quantities are the properties of MODEL_SET_PROPERTIES,
+    the abundances (abund_X), the volume integrated emissivities (labels of emis_labels)
+    and the electron temperatures weighted by the emissivities (T0_ + label).
+    A quantity missing for a model (e.g. a line not computed) is NaN.
+    usage:
+        MS = ModelSet(pc.iter_models('models/M'))
+        O3_Hb = MS.get_ratio('O__3_500684A', 'H__1_486133A')
+        MS_hot = MS[MS['T0'] > 1e4]
+        MS.save('grid.npz')
+        MS = ModelSet.load('grid.npz')
+    """
+    def __init__(self, models=None, T0_lines=True):
+        """
+        param:
+            - models [iterable of CloudyModel] e.g. a list returned by load_models, or iter_models
+                to read the models one at a time
+            - T0_lines [boolean] if True, the electron temperatures weighted by the emissivities are stored
+        """
+        self.log_ = pc.log_
+        self.calling = 'ModelSet'
+        self.T0_lines = T0_lines
+        self.model_names = np.zeros(0, dtype=str)
+        self.columns = {}
+        if models is not None:
+            self.add_models(models)
+
+    def add_models(self, models):
+        """
+        Add the outputs of the models to the set.
+        param:
+            - models [iterable of CloudyModel]
+        """
+        names = []
+        rows = []
+        for M in models:
+            names.append(M.model_name)
+            rows.append(self._model2row(M))
+        if len(rows) == 0:
+            return
+        keys = list(self.columns)
+        known = set(keys)
+        for row in rows:
+            for key in row:
+                if key not in known:
+                    keys.append(key)
+                    known.add(key)
+        n_old = len(self)
+        columns = {}
+        for key in keys:
+            column = np.full(n_old + len(rows), np.nan)
+            if key in self.columns:
+                column[:n_old] = self.columns[key]
+            column[n_old:] = [row.get(key, np.nan) for row in rows]
+            columns[key] = column
+        self.columns = columns
+        self.model_names = np.concatenate((self.model_names, names))
+        self.log_.message('{0} models added, {1} in the set'.format(len(rows), len(self)), calling=self.calling)
+
+    def remove_models(self, model_names):
+        """
+        Remove the models from the set. Names not in the set are ignored.
+        """
+        keep = ~np.isin(self.model_names, list(model_names))
+        if not keep.all():
+            self.model_names = self.model_names[keep]
+            self.columns = {name: column[keep] for name, column in self.columns.items()}
+
+    def _model2row(self, M):
+        row = {}
+        for prop in MODEL_SET_PROPERTIES:
+            try:
+                value = getattr(M, prop)
+            except Exception:
+                value = None
+            if value is not None and np.size(value) == 1:
+                row[prop] = float(value)
+        if M.abund is not None:
+            for elem, value in M.abund.items():
+                row['abund_' + elem] = value
+        if M.emis_full is not None and M.n_zones > 1:
+            row.update(zip(M.emis_labels, M.get_emis_vol_all()))
+            if self.T0_lines:
+                row.update(zip(['T0_' + label for label in M.emis_labels], M.get_T0_emis_all()))
+        return row
+
+    def __len__(self):
+        return len(self.model_names)
+
+    @property
+    def n_models(self):
+        """ Number of models in the set """
+        return len(self)
+
+    def keys(self):
+        """ Names of the stored quantities """
+        return list(self.columns)
+
+    def __contains__(self, key):
+        return key in self.columns
+
+    def __getitem__(self, key):
+        """
+        MS[name] returns the array of the quantity name for all the models.
+        MS[selection] (boolean mask, array of indices or slice) returns a new ModelSet with the selected models.
+        """
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, (int, np.integer)):
+            key = slice(key, key + 1 if key != -1 else None)
+        res = ModelSet(T0_lines=self.T0_lines)
+        res.model_names = self.model_names[key]
+        res.columns = {name: column[key] for name, column in self.columns.items()}
+        return res
+
+    def get_ratio(self, label1, label2):
+        """
+        Return the ratio of the two quantities (e.g. two line intensities) for all the models.
+        NaN or inf where label2 is 0.
+        """
+        return quiet_divide(self.columns[label1], self.columns[label2])
+
+    def save(self, file_):
+        """
+        Save the set in a single .npz binary file (.npz is added to file_ if missing).
+        """
+        file_ = _save_npz(file_, model_names=self.model_names, column_names=np.array(self.keys(), dtype=str),
+                          T0_lines=self.T0_lines,
+                          **{'col_{0:d}'.format(i): column for i, column in enumerate(self.columns.values())})
+        self.log_.message('{0} models saved in {1}'.format(len(self), file_), calling=self.calling)
+
+    def read(self, file_):
+        """
+        Replace the content of the set by the set saved in the file by save.
+        """
+        with np.load(_npz_name(file_)) as data:
+            self.T0_lines = bool(data['T0_lines'])
+            self.model_names = data['model_names']
+            self.columns = {str(name): data['col_{0:d}'.format(i)] for i, name in enumerate(data['column_names'])}
+
+    @classmethod
+    def load(cls, file_):
+        """
+        Return the ModelSet saved in the file by save.
+        """
+        res = cls()
+        res.read(file_)
+        return res
+
+## Per-zone arrays of CloudyModel (name_full attributes) stored by ZoneSet
+ZONE_SET_QUANTITIES = ('depth', 'radius', 'dr', 'dv', 'ff', 'te', 'ne', 'nH')
+# Geometric quantities always stored in float64 (dv is about 1e54 cm3, out of the float32 range)
+_ZONE_SET_FLOAT64 = ('depth', 'radius', 'dr', 'dv', 'ff', 'thickness', 'H_mass')
+
+## @include copyright.txt
+class ZoneSet(object):
+    """
+    Ragged container of the per-zone arrays of many CloudyModel, that have different numbers of zones.
+    The arrays of all the models are concatenated (all the zones are used, r_range is not applied),
+    model i using the zones offsets[i]:offsets[i+1]. Reductions over the zones of each model
+    (sums, integrals, means) are done for all the models at once.
+    usage:
+        ZS = ZoneSet(pc.iter_models('models/M'), emis_labels=['O__3_500684A', 'H__1_486133A'])
+        T0s = ZS.vol_mean('te', ZS['ne'] * ZS['nH'])
+        O3 = ZS.get_emis_vol('O__3_500684A')
+        te_model_3 = ZS.get_model('te', 3)
+    """
+    def __init__(self, models=None, quantities=ZONE_SET_QUANTITIES, emis_labels=None, dtype=np.float64):
+        """
+        param:
+            - models [iterable of CloudyModel] e.g. a list returned by load_models, or iter_models
+            - quantities [list of str] per-zone arrays to store (the name_full attributes of CloudyModel)
+            - emis_labels [list of str] emissivities to store. If None, those of the first model.
+                The emissivities of the lines missing in a model are NaN.
+            - dtype [numpy dtype] type of the stored physical quantities and emissivities
+                (the geometric quantities depth, radius, dr, dv, ff... are always stored in float64)
+        """
+        self.log_ = pc.log_
+        self.calling = 'ZoneSet'
+        self.quantities = tuple(quantities)
+        self.emis_labels = None if emis_labels is None else np.asarray(emis_labels)
+        self.dtype = np.dtype(dtype)
+        self.model_names = np.zeros(0, dtype=str)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.columns = {name: np.zeros(0, dtype=self._get_dtype(name)) for name in self.quantities}
+        self.emis = None
+        if models is not None:
+            self.add_models(models)
+
+    def _get_dtype(self, name):
+        return np.dtype(np.float64) if name in _ZONE_SET_FLOAT64 else self.dtype
+
+    def add_models(self, models):
+        """
+        Add the per-zone arrays of the models to the set.
+        param:
+            - models [iterable of CloudyModel]
+        """
+        names = []
+        n_zones = []
+        chunks = {name: [] for name in self.quantities}
+        emis_chunks = []
+        for M in models:
+            if M.empty_model:
+                self.log_.warn('{0} has no zone, not added'.format(M.model_name), calling=self.calling)
+                continue
+            names.append(M.model_name)
+            n_zones.append(M.n_zones_full)
+            for name in self.quantities:
+                chunks[name].append(np.atleast_1d(getattr(M, name + '_full')).astype(self._get_dtype(name)))
+            if self.emis_labels is None and M.emis_full is not None:
+                self.emis_labels = np.asarray(M.emis_labels)
+            if self.emis_labels is None:
+                # filled with NaN below if a later model defines the labels
+                emis_chunks.append(None)
+            else:
+                emis = np.full((len(self.emis_labels), M.n_zones_full), np.nan, dtype=self.dtype)
+                if M.emis_full is not None:
+                    emis_index = M._get_emis_index()
+                    for i, label in enumerate(self.emis_labels):
+                        i_emis = emis_index.get(label)
+                        if i_emis is not None:
+                            emis[i] = M.emis_full[i_emis]
+                emis_chunks.append(emis)
+        if len(names) == 0:
+            return
+        for name in self.quantities:
+            self.columns[name] = np.concatenate([self.columns[name]] + chunks[name])
+        if self.emis_labels is not None:
+            emis_chunks = [np.full((len(self.emis_labels), n), np.nan, dtype=self.dtype) if emis is None else emis
+                           for emis, n in zip(emis_chunks, n_zones)]
+            if self.emis is None:
+                self.emis = np.full((len(self.emis_labels), self.offsets[-1]), np.nan, dtype=self.dtype)
+            self.emis = np.concatenate([self.emis] + emis_chunks, axis=1)
+        self.offsets = np.concatenate((self.offsets, self.offsets[-1] + np.cumsum(n_zones)))
+        self.model_names = np.concatenate((self.model_names, names))
+        self.log_.message('{0} models added, {1} in the set'.format(len(names), len(self)), calling=self.calling)
+
+    def remove_models(self, model_names):
+        """
+        Remove the models from the set. Names not in the set are ignored.
+        """
+        keep = ~np.isin(self.model_names, list(model_names))
+        if keep.all():
+            return
+        n_zones = self.n_zones
+        keep_zones = np.repeat(keep, n_zones)
+        self.columns = {name: column[keep_zones] for name, column in self.columns.items()}
+        if self.emis is not None:
+            self.emis = self.emis[:, keep_zones]
+        self.offsets = np.concatenate(([0], np.cumsum(n_zones[keep])))
+        self.model_names = self.model_names[keep]
+
+    def __len__(self):
+        return len(self.model_names)
+
+    @property
+    def n_models(self):
+        """ Number of models in the set """
+        return len(self)
+
+    @property
+    def n_zones(self):
+        """ Number of zones of each model [int array] """
+        return np.diff(self.offsets)
+
+    def __getitem__(self, name):
+        """ Concatenated values of a per-zone quantity for all the models """
+        return self.columns[name]
+
+    def _get_values(self, a):
+        if isinstance(a, str):
+            return self.columns[a]
+        return a
+
+    def get_model(self, a, i):
+        """
+        Return the values of the model i (a view, no copy).
+        param:
+            - a [str or array] name of a quantity, or concatenated array (last axis on the zones, e.g. emis)
+            - i [int] index of the model
+        """
+        return self._get_values(a)[..., self.offsets[i]:self.offsets[i + 1]]
+
+    def segment_sum(self, a):
+        """
+        Return the sums over the zones of each model.
+        param:
+            - a [str or array] name of a quantity, or concatenated array (last axis on the zones)
+        return:
+            array of shape a.shape[:-1] + (n_models,)
+        """
+        values = self._get_values(a)
+        n_zones = self.n_zones
+        res = np.zeros(values.shape[:-1] + (len(self),), dtype=np.float64)
+        not_empty = n_zones > 0
+        if not_empty.any():
+            res[..., not_empty] = np.add.reduceat(values, self.offsets[:-1][not_empty], axis=-1, dtype=np.float64)
+        return res
+
+    def vol_integ(self, a):
+        """ Integral of a on the volume of each model \\f$\\int a.ff.dV\\f$ """
+        return self.segment_sum(self._get_values(a) * (self.columns['dv'] * self.columns['ff']))
+
+    def rad_integ(self, a):
+        """ Integral of a on the radius of each model \\f$\\int a.ff.dr\\f$ """
+        return self.segment_sum(self._get_values(a) * (self.columns['dr'] * self.columns['ff']))
+
+    def vol_mean(self, a, b=1.):
+        """ Mean value of a weighted by b on the volume of each model """
+        b = self._get_values(b)
+        return quiet_divide(self.vol_integ(self._get_values(a) * b),
+                            self.vol_integ(b * np.ones_like(self.columns['dv'])))
+
+    def rad_mean(self, a, b=1.):
+        """ Mean value of a weighted by b on the radius of each model """
+        b = self._get_values(b)
+        return quiet_divide(self.rad_integ(self._get_values(a) * b),
+                            self.rad_integ(b * np.ones_like(self.columns['dr'])))
+
+    def get_emis(self, label):
+        """ Concatenated emissivities of the line for all the models """
+        return self.emis[list(self.emis_labels).index(label)]
+
+    def get_emis_vol(self, label=None):
+        """
+        Volume integrated emissivities of the line for each model, or of all the lines if label is None
+        (array of shape (len(emis_labels), n_models))
+        """
+        if label is None:
+            return self.vol_integ(self.emis)
+        return self.vol_integ(self.get_emis(label))
+
+    def save(self, file_):
+        """
+        Save the set in a single .npz binary file (.npz is added to file_ if missing).
+        """
+        arrays = {'col_' + name: column for name, column in self.columns.items()}
+        if self.emis is not None:
+            arrays['emis'] = self.emis
+            arrays['emis_labels'] = self.emis_labels
+        file_ = _save_npz(file_, model_names=self.model_names, offsets=self.offsets,
+                          quantities=np.array(self.quantities, dtype=str), **arrays)
+        self.log_.message('{0} models saved in {1}'.format(len(self), file_), calling=self.calling)
+
+    def read(self, file_):
+        """
+        Replace the content of the set (quantities, emis_labels and dtype included) by the set saved
+        in the file by save.
+        """
+        with np.load(_npz_name(file_)) as data:
+            self.quantities = tuple(str(name) for name in data['quantities'])
+            self.emis_labels = data['emis_labels'] if 'emis_labels' in data else None
+            self.model_names = data['model_names']
+            self.offsets = data['offsets']
+            self.columns = {name: data['col_' + name] for name in self.quantities}
+            typed = [name for name in self.quantities if name not in _ZONE_SET_FLOAT64]
+            if typed:
+                self.dtype = self.columns[typed[0]].dtype
+            elif self.emis_labels is not None:
+                self.dtype = data['emis'].dtype
+            self.emis = None if self.emis_labels is None else data['emis']
+
+    @classmethod
+    def load(cls, file_):
+        """
+        Return the ZoneSet saved in the file by save.
+        """
+        res = cls()
+        res.read(file_)
+        return res
+
+## @include copyright.txt
+class GridWatcher(object):
+    """
+    Incremental reader of a grid of models still being computed (e.g. by run_cloudy with make -j).
+    Each call to update reads only the models finished since the previous call (new .out files,
+    or .out files modified since they were read) and adds them to a store (ModelSet or ZoneSet).
+    The .out files are identified by their path, modification time and size.
+    usage:
+        GW = GridWatcher('models/M', file_='grid.npz')
+        GW.update() # or GW.watch(delay=30.) to wait for the end of the grid
+        MS = GW.store
+    """
+    def __init__(self, model_name, store=None, file_=None, n_procs=1, executor=None, verbose=False, **kwargs):
+        """
+        param:
+            - model_name [str] generic name, the models are the "model_name*.out" files
+            - store [ModelSet or ZoneSet] where the models are added. Default: a new ModelSet
+            - file_ [str] .npz file where the store is saved after each update (.npz is added if missing).
+                If it exists, the store (which must then be empty) is filled with the set saved in it,
+                and the models already in it are not read again. The list of the read .out files
+                is saved in file_ + '.json'
+            - n_procs, executor, verbose, **kwargs: passed to iter_models
+        """
+        self.log_ = pc.log_
+        self.calling = 'GridWatcher'
+        self.model_name = model_name
+        self.file_ = None if file_ is None else _npz_name(file_)
+        self.n_procs = n_procs
+        self.executor = executor
+        self.verbose = verbose
+        self.kwargs = kwargs
+        if store is None:
+            store = ModelSet()
+        self.store = store
+        ## stat ([modification time, size]) of the .out files already read
+        self.seen = {}
+        if self.file_ is not None and os.path.exists(self.file_):
+            if len(store) > 0:
+                self.log_.error('{0} exists and the store is not empty'.format(self.file_), calling=self.calling)
+            store.read(self.file_)
+            if os.path.exists(self.file_ + '.json'):
+                with open(self.file_ + '.json') as f:
+                    self.seen = json.load(f)
+            self.log_.message('{0} models read from {1}'.format(len(self.store), self.file_), calling=self.calling)
+
+    def _get_new_models(self):
+        """ Return the stats of the finished .out files not yet read or modified since they were read """
+        stats = {}
+        for out_file in sorted(glob.glob(self.model_name + '*.out')):
+            stat = _file_stat(out_file)
+            if stat is not None and self.seen.get(out_file) != stat and _is_finished(out_file):
+                stats[out_file] = stat
+        return stats
+
+    def update(self):
+        """
+        Read the models finished since the last update and add them to the store.
+        return:
+            the number of .out files read (aborted or unreadable models included)
+        """
+        stats = self._get_new_models()
+        if len(stats) == 0:
+            return 0
+        # models computed again replace the old ones
+        self.store.remove_models([out_file[0:-4] for out_file in stats])
+        self.store.add_models(iter_models(mod_list=list(stats), verbose=self.verbose, n_procs=self.n_procs,
+                                          executor=self.executor, **self.kwargs))
+        self.seen.update(stats)
+        if self.file_ is not None:
+            # the set first: if interrupted in between, the models saved but not listed are read again
+            self.store.save(self.file_)
+            tmp_file = self.file_ + '.json.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump(self.seen, f)
+            os.replace(tmp_file, self.file_ + '.json')
+        return len(stats)
+
+    def watch(self, delay=10., n_models=None, timeout=None):
+        """
+        Call update every delay seconds, until n_models .out files are read or timeout seconds are spent.
+        Can be stopped with Ctrl-C, the store then holds the models read so far.
+        """
+        t0 = time.time()
+        try:
+            while True:
+                self.update()
+                if n_models is not None and len(self.seen) >= n_models:
+                    break
+                if timeout is not None and time.time() - t0 + delay > timeout:
+                    break
+                time.sleep(delay)
+        except KeyboardInterrupt:
+            self.log_.message('Stopped, {0} models in the store'.format(len(self.store)), calling=self.calling)
+
+## @include copyright.txt
+class ContinuumCube(object):
+    """
+    Continua of many models resampled on a common grid, stored on disk as a dense (n_models, n_bins) array
+    (file_.npy, read as a memory map) and a description file (file_.json).
+    The continua are rebinned conserving the flux (see misc.rebin_trapz): the values are the mean
+    continuum in each bin, unit being per x_unit (e.g. 'esA' with 'Ang', 'esHz' with 'Hz').
+    usage:
+        CC = ContinuumCube.build('grid_cont', np.logspace(3, 4, 1001), model_name='models/M', n_procs=4)
+        CC = ContinuumCube('grid_cont') # later
+        spectra = CC[CC.model_names == 'models/M_12'] # or CC.get('models/M_12')
+    """
+    def __init__(self, file_):
+        """
+        param:
+            - file_ [str] name of the cube, without extension, as given to build
+        """
+        self.log_ = pc.log_
+        self.calling = 'ContinuumCube'
+        self.file_ = file_
+        with open(file_ + '.json') as f:
+            desc = json.load(f)
+        self.model_names = np.array(desc['model_names'], dtype=str)
+        self.edges = np.array(desc['edges'])
+        self.cont = desc['cont']
+        self.unit = desc['unit']
+        self.x_unit = desc['x_unit']
+        self.dist_norm = desc['dist_norm']
+        ## (n_models, n_bins) array, NaN for the models not read
+        self.data = np.load(file_ + '.npy', mmap_mode='r')
+
+    @classmethod
+    def build(cls, file_, edges, model_name=None, mod_list=None, cont='ntrans', unit='esA', x_unit='Ang',
+              dist_norm='at_earth', n_procs=1, executor=None, **kwargs):
+        """
+        Read the models, rebin their continuum and write the cube. Return the ContinuumCube.
+        param:
+            - file_ [str] name of the cube, the files file_.npy and file_.json are written
+            - edges [array] increasing edges of the bins, in x_unit
+            - model_name, mod_list: as in load_models
+            - cont, unit, dist_norm: see CloudyModel.get_cont_y
+            - x_unit [str] see CloudyModel.get_cont_x
+            - n_procs, executor: as in load_models. The models are read and rebinned by the workers.
+            - **kwargs: arguments passed to CloudyModel. By default only the .rad and .cont files are read
+                (see _CONT_CUBE_READ), kwargs override it.
+        The files are written with temporary names and renamed at the end, so an interrupted build
+        leaves no partial cube.
+        """
+        mod_list = _get_mod_list(model_name, mod_list, None)
+        if mod_list is None:
+            return None
+        model_names = [outfile[0:-4] if outfile[-4::] == '.out' else outfile for outfile in mod_list]
+        edges = np.asarray(edges, dtype=float)
+        rebin = partial(_rebin_model_cont, kwargs=dict(_CONT_CUBE_READ, **kwargs), edges=edges, cont=cont, unit=unit, x_unit=x_unit,
+                        dist_norm=dist_norm)
+        tmp_npy = file_ + '.tmp.npy'
+        tmp_json = file_ + '.tmp.json'
+        own_pool = None
+        if executor is None and n_procs > 1 and len(model_names) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = own_pool = ProcessPoolExecutor(max_workers=n_procs)
+        try:
+            data = np.lib.format.open_memmap(tmp_npy, mode='w+', dtype=np.float64,
+                                             shape=(len(model_names), edges.size - 1))
+            rows = map(rebin, model_names) if executor is None else executor.map(rebin, model_names)
+            for i, row in enumerate(rows):
+                if row is None:
+                    pc.log_.warn('Continuum of {0} not read'.format(model_names[i]), calling='ContinuumCube')
+                    data[i] = np.nan
+                else:
+                    data[i] = row
+            data.flush()
+            del data
+            with open(tmp_json, 'w') as f:
+                json.dump({'model_names': model_names, 'edges': edges.tolist(), 'cont': cont, 'unit': unit,
+                           'x_unit': x_unit, 'dist_norm': dist_norm}, f)
+            os.replace(tmp_npy, file_ + '.npy')
+            os.replace(tmp_json, file_ + '.json')
+        except BaseException:
+            for tmp_file in (tmp_npy, tmp_json):
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+            raise
+        finally:
+            if own_pool is not None:
+                own_pool.shutdown()
+        pc.log_.message('{0} continua written in {1}.npy'.format(len(model_names), file_), calling='ContinuumCube')
+        return cls(file_)
+
+    def __len__(self):
+        return len(self.model_names)
+
+    @property
+    def n_models(self):
+        """ Number of models in the cube """
+        return len(self)
+
+    @property
+    def x(self):
+        """ Centers of the bins """
+        return (self.edges[1:] + self.edges[:-1]) / 2.
+
+    def __getitem__(self, key):
+        """ Continua of the selected models (index, slice, boolean mask or array of indices) """
+        return self.data[key]
+
+    def get(self, model_name):
+        """ Continuum of the model """
+        i = np.flatnonzero(self.model_names == model_name)
+        if i.size == 0:
+            self.log_.warn('{0} not in the cube'.format(model_name), calling=self.calling)
+            return None
+        return self.data[i[0]]
+
+## Default reading parameters of ContinuumCube.build: only r_in, r_out (.rad file) and the continuum are needed
+_CONT_CUBE_READ = {'read_phy': False, 'read_emis': False, 'read_grains': False, 'list_elem': []}
+
+def _npz_name(file_):
+    """ Name of the file written by np.savez(file_) """
+    return file_ if file_.endswith('.npz') else file_ + '.npz'
+
+def _save_npz(file_, **arrays):
+    """
+    Save the arrays with np.savez in a temporary file renamed as file_ (with .npz added if missing)
+    when complete, so that an interrupted save leaves the previous file untouched. Return the file name.
+    """
+    file_ = _npz_name(file_)
+    tmp_file = file_ + '.tmp'
+    try:
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_file, file_)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    return file_
+
+def _rebin_model_cont(model_name, kwargs, edges, cont, unit, x_unit, dist_norm):
+    """
+    Read a model for ContinuumCube.build (may be run in another process) and return its rebinned continuum,
+    or None if the model is not read.
+    """
+    status, M = _load_model(model_name, kwargs)
+    if status != 'read':
+        return None
+    try:
+        x = M.get_cont_x(unit=x_unit)
+        y = M.get_cont_y(cont=cont, unit=unit, dist_norm=dist_norm)
+    except Exception:
+        return None
+    if x is None or y is None:
+        return None
+    return rebin_trapz(x, y, edges)
+
+## Strings written by Cloudy at the end of the .out file
+_END_MARKERS = (b'Cloudy ends', b'Cloudy exited')
+
+def _is_finished(out_file, n_bytes=4096):
+    """ True if Cloudy finished writing the .out file """
+    try:
+        with open(out_file, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - n_bytes, 0))
+            tail = f.read()
+    except OSError:
+        return False
+    return any(marker in tail for marker in _END_MARKERS)
@@ -162,9 +162,8 @@ class CubCoord(object):
     def theta(self):
         if self.__theta is None:
             self.__theta = np.zeros_like(self.r)
-            oldsettings = np.seterr(all='ignore')
-            self.__theta = np.squeeze(arcsin(self.z / self.r)) * self._unit_coeff
-            misc.revert_seterr(oldsettings)
+            with np.errstate(all='ignore'):
+                self.__theta = np.squeeze(arcsin(self.z / self.r)) * self._unit_coeff
             self.__theta[self.r == 0.] = 0.
         return self.__theta
     
@@ -213,9 +212,7 @@ class CubCoord(object):
         max_r = np.max(self.r)
         for i, param in enumerate(params):
             tmp += param * (self.r/max_r)**i
-        oldsettings = np.seterr(all='ignore')
-        tmp = tmp / self.r
-        misc.revert_seterr(oldsettings)
+        tmp = misc.quiet_divide(tmp, self.r)
         tt = (self.r == 0.)
         tmp[tt] = 0
         vel_x = tmp * self.x 
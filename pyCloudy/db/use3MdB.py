@@ -511,13 +511,12 @@ class writeTab(object):
         self.insert_in_dic('Hb_EW', self.CloudyModel.get_Hb_EW())
         self.insert_in_dic('Ha_EW', self.CloudyModel.get_Ha_EW())
         self.log_.debug('pass 3', calling='model2dic')
+        Es = ('11.26', '35.12', '40.73', '47.45', '77.41', '113.90',
+              '138.12', '151.06', '233.60', '262.10', '361.00')
+        with np.errstate(divide='ignore'):
+            logQEs = np.log10(self.CloudyModel.get_Q_above(np.array(Es, dtype=float), unit='eV'))
         if self.CloudyModel.n_zones > 1:
-            for E in ('11.26', '35.12', '40.73', '47.45', '77.41', '113.90', 
-                      '138.12', '151.06', '233.60', '262.10', '361.00'):
-                Eev = float(E)
-                logQE = np.log10(self.CloudyModel.get_interp_cont(x_value=Eev,
-                                                                             x_unit='eV',
-                                                                             unit='Q'))
+            for E, logQE in zip(Es, logQEs):
                 logPhiE = logQE - np.log10(4 * np.pi * self.CloudyModel.radius[0]**2)
                 if not np.isfinite(logQE):
                     logQE = -100.
@@ -558,12 +557,7 @@ class writeTab(object):
             self.log_.debug('pass 6', calling='model2dic')
         else:
             self.log_.debug('pass 4b', calling='model2dic')
-            for E in ('11.26', '35.12', '40.73', '47.45', '77.41', '113.90', 
-                      '138.12', '151.06', '233.60', '262.10', '361.00'):
-                Eev = float(E)
-                logQE = np.log10(self.CloudyModel.get_interp_cont(x_value=Eev,
-                                                                             x_unit='eV',
-                                                                             unit='Q'))
+            for E, logQE in zip(Es, logQEs):
                 logPhiE = logQE - np.log10(4 * np.pi * self.CloudyModel.radius**2)
                 if not np.isfinite(logQE):
                     logQE = -100.
@@ -637,9 +631,12 @@ class writeTab(object):
                 self.CloudyModel.emis_labels_17 = self.CloudyModel.emis_labels
             
             # Add all the lines from the CloudyModel to the table
+            emis_vol = self.CloudyModel.get_emis_vol_all()
+            emis_rad = self.CloudyModel.get_emis_rad_all()
             for clabel in self.CloudyModel.emis_labels:
-                self.insert_in_dic(clabel, self.CloudyModel.get_emis_vol(clabel))
-                self.insert_in_dic(clabel+'_rad', self.CloudyModel.get_emis_rad(clabel))
+                i_emis = self.CloudyModel._i_emis(clabel)
+                self.insert_in_dic(clabel, emis_vol[i_emis])
+                self.insert_in_dic(clabel+'_rad', emis_rad[i_emis])
             # DO NOT FORGET TO RUN remove_lines(OVN_dic, ('BLND_436300A', 'BLND_575500A')) and the BLDR ones
 
     def insert_model(self, add2dic=None):
@@ -691,6 +688,8 @@ class writeTab(object):
             values_ab_str = "{0}, '{1}', ".format(self.last_N, self._dic['ref'])
             values_te_str = "{0}, '{1}', ".format(self.last_N, self._dic['ref'])        
             abion_fields = self.MdB.get_fields(from_ = self.OVN_dic['abion_table'])
+            ab_ion = {integ: self.CloudyModel.get_ab_ion_all(integ, 'ne') for integ in ('vol', 'rad')}
+            t_ion_all = {integ: self.CloudyModel.get_T0_ion_all(integ, 'ne') for integ in ('vol', 'rad')}
             for abion_field in abion_fields:
                 if (abion_field != 'N') and (abion_field != 'ref'):
                     ab,elem_long, integ, ion = abion_field.split('_')
@@ -703,20 +702,13 @@ class writeTab(object):
                         if self.CloudyModel.is_valid_ion(elem, ion):
                             ab_fields_str += '`{0}`, '.format(abion_field)
                             t_fields_str += '`T_{0}`, '.format(abion_field[2::])
-                            if integ == 'vol':
-                                values_ab_str += '{0}, '.format(self.CloudyModel.get_ab_ion_vol_ne(elem, ion))
-                                t_ion = self.CloudyModel.get_T0_ion_vol_ne(elem, ion)
+                            if integ in ('vol', 'rad'):
+                                values_ab_str += '{0}, '.format(ab_ion[integ][elem][ion])
+                                t_ion = t_ion_all[integ][elem][ion]
                                 if np.isfinite(t_ion):
                                     values_te_str += '{0}, '.format(t_ion)
                                 else:
                                     values_te_str += '-40, '
-                            elif integ == 'rad':
-                                values_ab_str += '{0}, '.format(self.CloudyModel.get_ab_ion_rad_ne(elem, ion))
-                                t_ion = self.CloudyModel.get_T0_ion_rad_ne(elem, ion)
-                                if np.isfinite(t_ion):
-                                    values_te_str += '{0}, '.format(t_ion)     
-                                else:
-                                    values_te_str += '-40, '
             ab_fields_str = ab_fields_str[:-2]
             t_fields_str = t_fields_str[:-2]
             values_ab_str = values_ab_str[:-2]
@@ -732,10 +724,11 @@ class writeTab(object):
         if self.CloudyModel.n_zones > 1:
             fields_str = '`N`, `ref`,'
             values_tem_str = "{0}, '{1}',".format(self.last_N,  self._dic['ref'])
+            t_emis_all = self.CloudyModel.get_T0_emis_all()
             for clabel in self.CloudyModel.emis_labels:
                 try:
                     fields_str += '`T_{0}`, '.format(clabel)
-                    t_emis = self.CloudyModel.get_T0_emis(clabel)
+                    t_emis = t_emis_all[self.CloudyModel._i_emis(clabel)]
                     if np.isfinite(t_emis):
                         values_tem_str += '{0}, '.format(t_emis)
                     else:
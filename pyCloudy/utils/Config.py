@@ -171,6 +171,20 @@ class _Config(object):
     db_connector = property(_get_db_coonector, _set_db_coonector, None, None)
     
     def def_c13c17(self):
+        """
+        Read the table of correspondence between c13 and c17 line labels and build the mappings used
+        by misc.convert_c13_c17, misc.convert_c17_c13 and misc.convert_labels (first occurrence in the table is used).
+        """
         filename = os.path.join(os.path.dirname(sys._getframe(1).f_code.co_filename), 'convert_c17_c13.txt')
         self.c13c17 = np.genfromtxt(filename, dtype='U20, U20', names='c17, c13')
+        self.c13_to_c17 = {}
+        self.c17_to_c13 = {}
+        for c17, c13 in zip(self.c13c17['c17'], self.c13c17['c13']):
+            self.c13_to_c17.setdefault(str(c13), str(c17))
+            self.c17_to_c13.setdefault(str(c17), str(c13))
+        # sorted labels and corresponding ones, for vectorized conversions
+        self._c13c17_sorted = {}
+        for from_, to in (('c13', 'c17'), ('c17', 'c13')):
+            labels, i_first = np.unique(self.c13c17[from_], return_index=True)
+            self._c13c17_sorted[from_] = (labels, self.c13c17[to][i_first])
     
\ No newline at end of file
@@ -0,0 +1,127 @@
+import numpy as np
+import pyCloudy as pc
+from pyCloudy.utils.misc import quiet_divide
+
+class FilterBank(object):
+    """
+    Set of photometric bands (top-hat or tabulated transmission curves) integrated together
+    against spectra.
+    FB = FilterBank()
+    FB.add_top_hat('B1', 4000., 5000.)
+    FB.add_file('V', 'filters/V.dat')
+    fluxes = FB.integrate(x, y) # y can be 2D, one spectrum per row, all on the x mesh
+    """
+
+    def __init__(self, x_unit='Ang'):
+        """
+        Filter bank tool.
+        params:
+            - x_unit [str] : unit of the wavelengths/energies of the bands, one of the units of CloudyModel.get_cont_x
+        example:
+            FB = FilterBank()
+            FB.add_top_hat('UV', 912., 2000.)
+            M.get_band_integ(FB, unit='esA')
+        """
+        self.log_ = pc.log_
+        self.calling = 'FilterBank'
+        self.x_unit = x_unit
+        self.names = []
+        self._bands = [] # (lam_min, lam_max) for top-hat bands, (lam, transmission) for tabulated curves
+        self._top_hat = []
+        self._weights_cache = None # (x, weights) of the last mesh used
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_top_hat(self, name, lam_min, lam_max):
+        """
+        Add a band of transmission 1 between lam_min and lam_max.
+        """
+        if lam_max <= lam_min:
+            self.log_.error('lam_max must be greater than lam_min for band {0}'.format(name), calling=self.calling)
+        self._add(name, (float(lam_min), float(lam_max)), True)
+
+    def add_curve(self, name, lam, transmission):
+        """
+        Add a band defined by its transmission curve (transmission 0 outside of lam).
+        """
+        lam = np.asarray(lam, dtype=float)
+        transmission = np.asarray(transmission, dtype=float)
+        if lam.shape != transmission.shape or lam.ndim != 1 or lam.size < 2:
+            self.log_.error('lam and transmission must be 1D arrays of the same size for band {0}'.format(name),
+                            calling=self.calling)
+        sort = np.argsort(lam)
+        self._add(name, (lam[sort], transmission[sort]), False)
+
+    def add_file(self, name, file_, **kwargs):
+        """
+        Add a band from a file with 2 columns: wavelength (in x_unit) and transmission.
+        kwargs are passed to np.loadtxt (e.g. skiprows, delimiter).
+        """
+        lam, transmission = np.loadtxt(file_, usecols=(0, 1), unpack=True, **kwargs)
+        self.add_curve(name, lam, transmission)
+
+    def _add(self, name, band, top_hat):
+        if name in self.names:
+            self.log_.warn('Band {0} replaced'.format(name), calling=self.calling)
+            i = self.names.index(name)
+            self._bands[i] = band
+            self._top_hat[i] = top_hat
+        else:
+            self.names.append(name)
+            self._bands.append(band)
+            self._top_hat.append(top_hat)
+        self._weights_cache = None
+
+    def get_weights(self, x):
+        """
+        Return the (n_bands, x.size) array W such that the integrals of y.T(x) over the bands are W @ y.
+        For top-hat bands, the cumulative integral is linearly interpolated at the edges not on the mesh,
+        tabulated curves are interpolated on x. The weights of the last mesh used are kept.
+        """
+        x = np.asarray(x, dtype=float)
+        if self._weights_cache is not None and np.array_equal(self._weights_cache[0], x):
+            return self._weights_cache[1]
+        reverse = x[0] > x[-1]
+        x_sorted = x[::-1] if reverse else x
+        weights = np.zeros((len(self), x.size))
+        dx = np.diff(x_sorted)
+        trapz_w = np.zeros_like(x_sorted)
+        trapz_w[:-1] += dx / 2.
+        trapz_w[1:] += dx / 2.
+        for i, (band, top_hat) in enumerate(zip(self._bands, self._top_hat)):
+            if top_hat:
+                weights[i] = _top_hat_weights(x_sorted, band[0], band[1])
+            else:
+                weights[i] = np.interp(x_sorted, band[0], band[1], left=0., right=0.) * trapz_w
+        if reverse:
+            weights = weights[:, ::-1]
+        weights.flags.writeable = False
+        self._weights_cache = (x.copy(), weights)
+        return weights
+
+    def integrate(self, x, y):
+        """
+        Return the integrals of y.T(x).dx over the bands, for one spectrum (y 1D) or many spectra on the same mesh
+        (y of shape (..., x.size)). The result has the shape y.shape[:-1] + (n_bands,).
+        """
+        return np.asarray(y) @ self.get_weights(x).T
+
+    def get_mean(self, x, y):
+        """
+        Return the mean values of y in the bands: integral of y.T(x).dx / integral of T(x).dx
+        NaN for the bands outside of x.
+        """
+        return quiet_divide(self.integrate(x, y), self.get_weights(x).sum(axis=1))
+
+def _top_hat_weights(x, x_min, x_max):
+    """
+    Weights w such that w @ y is the trapezoidal integral of y between x_min and x_max (x increasing).
+    The cumulative integral is linearly interpolated at the edges: each segment of the mesh
+    contributes in proportion to the fraction of its length inside the band.
+    """
+    inside = np.clip(np.minimum(x[1:], x_max) - np.maximum(x[:-1], x_min), 0., None)
+    w = np.zeros_like(x)
+    w[:-1] += inside / 2.
+    w[1:] += inside / 2.
+    return w
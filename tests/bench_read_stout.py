@@ -0,0 +1,262 @@
+"""
+Benchmark of CloudyModel._read_stout against the previous line by line implementation.
+A large .out file is made by repeating the iterations of a model.
+usage: python bench_read_stout.py [model_name] [number of repetitions]
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+import pyCloudy as pc
+from pyCloudy.utils.init import LIST_ALL_ELEM
+from pyCloudy.utils.misc import sextract
+from pyCloudy.utils.physics import ATOMIC_MASS
+
+def legacy_read_stout(self, emis_is_log):
+    """ CloudyModel._read_stout before the dispatch table was introduced """
+    self.out = {}
+    file_name = self.model_name + '.out'
+    self.C3D_comments = []
+    self.comments = []
+    self.warnings = []
+    self.cautions = []
+    try:
+        file_ = open(file_name, 'r')
+        self.out_exists = True
+    except:
+        self.log_.warn(file_name + ' NOT read.', calling = self.calling)
+        self.out_exists = False
+        self.info = '<!!! Model {0} without output file>'.format(self.model_name)
+        return None
+    self.date_model = time.ctime(os.path.getctime(file_name))
+    self.Teff = None
+    self.out['Cloudy ends'] = ''
+    self.out['stop'] = ''
+    self.cloudy_version = ''
+    for line in file_:
+        if 'Cloudy' in line and 'testing' not in line and 'Please' not in line and self.cloudy_version == '':
+            self.cloudy_version = line.strip()
+            if self.cloudy_version_major is None:
+                version_match_obj = re.match("Cloudy \(?c?(\d\d)\.\d\d\)?", self.cloudy_version, flags=0)
+                try:
+                    self.cloudy_version_major = version_match_obj.group(1)
+                    self.cloudy_version_major = int(self.cloudy_version_major)
+                except:
+                    self.log_.error(f'pyCloudy unable to determine version from "{self.cloudy_version}". Try to set it by hand using cloudy_version_major keyword', calling = self.calling)
+        elif line[0:8] == ' ####  1':
+            self.out['###First'] = line
+        elif line[0:4] == ' ###':
+            self.out['###Last'] = line
+        elif 'Calculation stopped' in line:
+            self.out['stop'] = line
+        elif 'Cloudy ends' in line:
+            self.out['Cloudy ends'] = line
+        elif 'something went wrong' in line:
+            self.out['wrong'] = line
+        elif 'Gas Phase Chemical Composition' in line:
+            for i in range(4):
+                self.out['Chem' + str(i + 1)] = next(file_)
+        elif 'Grain Chemical Composition' in line:
+            self.out['GrainChem'] = next(file_)
+        elif 'Dust to gas ratio' in line:
+            self.out['D/G'] = line
+        elif "* grains" in line:
+            self.out['grains'] = line
+        elif 'iterate' in line:
+            self.out['iterate'] = line
+        elif 'Hi-Con' in line:
+            i = 1
+            while i < 8:
+                line = next(file_)
+                if line != '\n' and "WARN" not in line:
+                    self.out['SED' + str(i)] = line
+                    i += 1
+        elif 'table star' in line:
+            self.out['table star'] = line
+        elif 'table SED' in line:
+            self.out['table SED'] = line
+        elif 'Blackbody' in line:
+            self.out['Blackbody'] = line
+            try:
+                self.Teff = np.float64(pc.sextract(self.out['Blackbody'], 'Blackbody ', '*'))
+            except:
+                try:
+                    self.Teff = np.float64(pc.sextract(self.out['Blackbody'], 'Blackbody ', '\n'))
+                except:
+                    self.Teff = None
+        elif 'hden' in line:
+            self.out['hden'] = line
+        elif 'dlaw' in line:
+            self.out['dlaw'] = line
+        elif 'TOTL  4861A' in line:
+            self.out['Hbeta'] = line
+        elif 'H  1      4861.36A' in line:
+            self.out['Hbeta'] = line
+        elif 'H  1      4861.33A' in line:
+            self.out['Hbeta'] = line
+        elif 'luminosity' in line:
+            self.out['luminosity'] = line
+        elif 'turbulence' in line:
+            self.out['turbulence'] = line
+        elif 'fudge' in line:
+            self.out['fudge'] = line
+        elif 'distance' in line:
+            self.out['distance'] = line
+            dist_str = sextract(line, '=', 'kpc')
+            dist_set = False
+            if 'linear' in line:
+                correc = lambda x: x
+            else:
+                correc = lambda x: 10.**x
+            if dist_str != '':
+                self.distance = correc(np.float64(dist_str))
+                dist_set = True
+            dist_str = sextract(line, '=', 'parsecs')
+            if dist_str != '':
+                self.distance = correc(np.float64(dist_str)) / 1e3
+                dist_set = True
+            dist_str = sextract(line, '=', 'cm')
+            if dist_str != '':
+                self.distance = correc(np.float64(dist_str)) / pc.CST.KPC
+                dist_set = True
+            if not dist_set:
+                self.log_.warn('Unable to determine distance', calling = self.calling)
+        elif '#C3D' in line:
+            self.C3D_comments.append(line)
+        elif '# **' in line:
+            self.comments.append(line)
+        elif line[0:3] == ' C-':
+            self.cautions.append(line)
+        elif line[0:3] == '  !' or line[0:3] == ' W-':
+            self.warnings.append(line)
+    file_.close()
+    try:
+        if int(self.cloudy_version_major) >= 17:
+            self.emis_is_log = False
+        else:
+            self.emis_is_log = emis_is_log
+    except:
+        self.emis_is_log = emis_is_log
+    try:
+        self.theta = float(pc.sextract(self.C3D_comments, 'theta = ', ' ')[0])
+    except:
+        self.theta = None
+    try:
+        self.phi = float(pc.sextract(self.C3D_comments, 'phi = ', ' ')[0])
+    except:
+        self.phi = None
+    self.Q = np.zeros(4)
+    self.Phi = np.zeros(4)
+    try:
+        self.Q[0] = float(pc.sextract(self.out['SED2'], 'Q(1.0-1.8):', 'Q(1.8-4.0):'))
+        self.Q[1] = float(pc.sextract(self.out['SED2'], 'Q(1.8-4.0):', 'Q(4.0-20):'))
+        self.Q[2] = float(pc.sextract(self.out['SED2'], 'Q(4.0-20):', 'Q(20--):'))
+        self.Q[3] = float(pc.sextract(self.out['SED2'], 'Q(20--):', 'Ion pht'))
+        self.Q = 10.**self.Q
+        self.plan_par = False
+    except:
+        pass
+    self.Q0 = self.Q.sum()
+    try:
+        self.Phi[0] = float(pc.sextract(self.out['SED2'], 'phi(1.0-1.8):', 'phi(1.8-4.0):'))
+        self.Phi[1] = float(pc.sextract(self.out['SED2'], 'phi(1.8-4.0):', 'phi(4.0-20):'))
+        self.Phi[2] = float(pc.sextract(self.out['SED2'], 'phi(4.0-20):', 'phi(20--):'))
+        self.Phi[3] = float(pc.sextract(self.out['SED2'], 'phi(20--):', 'Ion pht'))
+        self.Phi = 10.**self.Phi
+        self.plan_par = True
+    except:
+        pass
+    self.Phi0 = self.Phi.sum()
+
+    self.abund = {}
+    try:
+        Chem = self.out['Chem1'][0:-1]
+        chem_is_ok = True
+        if self.out['Chem2'] != ' \n':
+            Chem += self.out['Chem2'][0:-1]
+            if self.out['Chem3'] != ' \n':
+                Chem += self.out['Chem3'][0:-1]
+                if self.out['Chem4'] != ' \n':
+                    Chem += self.out['Chem4'][0:-1]
+        self.gas_mass_per_H = 0.
+        for ab_str in LIST_ALL_ELEM:
+            if len(ab_str) == 1:
+                sub1 = ab_str + ' :'
+            else:
+                sub1 = ab_str + ':'
+            try:
+                self.abund[ab_str] = float(pc.sextract(Chem, sub1, 8))
+            except:
+                self.log_.message(ab_str + ' abundance not defined', calling = self.calling)
+            if (ab_str in ATOMIC_MASS) and (ab_str in self.abund):
+                self.gas_mass_per_H += 10**self.abund[ab_str] * ATOMIC_MASS[ab_str]
+    except:
+        chem_is_ok = False
+    if ("ABORT" in self.out['Cloudy ends']) or ("aborted" in self.out['stop']) or (not chem_is_ok):
+        self.aborted = True
+        self.log_.warn('Model aborted', calling = self.calling)
+        self.info = '<!!! Model {0} aborted>'.format(self.model_name)
+    else:
+        self.aborted = False
+    return True
+
+def make_big_out(model_name, n_rep, dir_):
+    """
+    Write in dir_ a model whose .out file contains the iterations of model_name repeated n_rep times.
+    """
+    with open(model_name + '.out') as f:
+        lines = f.readlines()
+    i_first = [i for i, line in enumerate(lines) if line[0:8] == ' ####  1'][0]
+    i_ends = [i for i, line in enumerate(lines) if 'Cloudy ends' in line][0]
+    new_name = os.path.join(dir_, 'big')
+    with open(new_name + '.out', 'w') as f:
+        f.writelines(lines[:i_first] + lines[i_first:i_ends] * n_rep + lines[i_ends:])
+    return new_name
+
+def compare(M1, M2):
+    for attr in ('out', 'C3D_comments', 'comments', 'warnings', 'cautions', 'cloudy_version', 'cloudy_version_major',
+                 'Teff', 'distance', 'theta', 'phi', 'Q0', 'Phi0', 'abund', 'aborted', 'emis_is_log'):
+        if getattr(M1, attr, None) != getattr(M2, attr, None):
+            print('Difference in {0}'.format(attr))
+            return False
+    return np.array_equal(M1.Q, M2.Q) and np.array_equal(M1.Phi, M2.Phi)
+
+def bench(model_name, n_loop=5):
+    M1 = pc.CloudyModel(model_name, read_all_ext=False)
+    M2 = pc.CloudyModel(model_name, read_all_ext=False)
+    t0 = time.time()
+    for i in range(n_loop):
+        legacy_read_stout(M1, emis_is_log=True)
+    t1 = time.time()
+    for i in range(n_loop):
+        M2._read_stout(emis_is_log=True)
+    t2 = time.time()
+    same = compare(M1, M2)
+    for i in range(n_loop):
+        M2._read_stout(emis_is_log=True, read_out_until='###First')
+    t3 = time.time()
+    size = os.path.getsize(model_name + '.out') / 1024.**2
+    print('{0}: {1:.1f} Mb, same results: {2}'.format(model_name, size, same))
+    print('  legacy: {0:8.2f} ms'.format((t1 - t0) / n_loop * 1e3))
+    print('  new:    {0:8.2f} ms'.format((t2 - t1) / n_loop * 1e3))
+    print('  new, stopping at ###First: {0:8.2f} ms'.format((t3 - t2) / n_loop * 1e3))
+
+if __name__ == '__main__':
+    pc.log_.level = 0
+    if len(sys.argv) > 1:
+        model_name = sys.argv[1]
+    else:
+        model_name = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'M17')
+    if len(sys.argv) > 2:
+        n_rep = int(sys.argv[2])
+    else:
+        n_rep = 200
+    bench(model_name)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        bench(make_big_out(model_name, n_rep, tmp_dir))
+    finally:
+        shutil.rmtree(tmp_dir)
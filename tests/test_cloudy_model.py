@@ -0,0 +1,399 @@
+import os
+import numpy as np
+import pytest
+import pyCloudy as pc
+
+MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'M17')
+
+@pytest.fixture(scope='module')
+def model():
+    return pc.CloudyModel(MODEL)
+
+def test_label_index(model):
+    for i, label in enumerate(model.emis_labels):
+        assert model._i_emis(label) == i
+        assert model._l_emis(label) == label
+        assert np.array_equal(model.get_emis(label), model.emis_full[i][model.r_range])
+    assert model._i_emis('NOT_A_LINE') is None
+    M = pc.CloudyModel(MODEL)
+    M.copy_line('COPY_486133A', M.Hbeta_label)
+    assert M._i_emis('COPY_486133A') == M.n_emis - 1
+    assert M.get_emis_vol('COPY_486133A') == M.get_emis_vol(M.Hbeta_label)
+    # The index follows label arrays replaced from outside
+    M.emis_labels = np.append(M.emis_labels, 'NEW_LINE')
+    M.emis_labels_17 = M.emis_labels
+    M.emis_full = np.vstack((M.emis_full, M.emis_full[0]))
+    assert M._i_emis('NEW_LINE') == M.emis_full.shape[0] - 1
+
+def test_convert_labels():
+    from pyCloudy.utils.misc import convert_labels, convert_c13_c17, convert_c17_c13
+    table = pc.config.c13c17
+    labels_17 = list(table['c17']) + ['NOT_A_LINE']
+    labels_13 = list(table['c13']) + ['NOT_A_LINE']
+    assert list(convert_labels(labels_17, from_='c17')) == [convert_c17_c13(label) for label in labels_17]
+    assert list(convert_labels(labels_13, from_='c13')) == [convert_c13_c17(label) for label in labels_13]
+    assert convert_c17_c13(table['c17'][0]) == table['c13'][0]
+    assert convert_c13_c17('NOT_A_LINE') == ''
+
+def test_structured_to_2d(model):
+    from pyCloudy.utils.misc import structured_to_2d
+    emis = model._res['emis']
+    res = structured_to_2d(emis, model.emis_labels)
+    assert res.flags['C_CONTIGUOUS']
+    assert np.array_equal(res, np.array([emis[label] for label in model.emis_labels]))
+    assert np.array_equal(model.emis_full, res)
+    assert structured_to_2d(emis[0], model.emis_labels[:2]).shape == (2, 1)
+
+def test_dtype(model):
+    M = pc.CloudyModel(MODEL, dtype=np.float32)
+    assert M.emis_full.dtype == np.float32
+    assert M.ionic_full['O'].dtype == np.float32
+    assert M._res['cont'].dtype['incident'] == np.float32
+    assert M._res['cont'].dtype[0] == np.float64
+    lab = model.Hbeta_label
+    assert M.get_emis_vol(lab).dtype == np.float64
+    assert np.isclose(M.get_emis_vol(lab), model.get_emis_vol(lab), rtol=1e-6)
+    assert np.isclose(M.get_ab_ion_vol('O', 2), model.get_ab_ion_vol('O', 2), rtol=1e-6)
+    assert np.allclose(M.get_cont_y(), model.get_cont_y(), rtol=1e-6)
+    # the continua are not copied, and only the x units used are computed
+    continuum = M._get_continuum()
+    assert all(y.dtype == np.float32 and np.shares_memory(y, M._res['cont']) for y in continuum.y)
+    assert list(continuum._x) == []
+    M.get_cont_x('Ang')
+    assert list(continuum._x) == ['Ang']
+    M.copy_line('Hbeta_copy', lab)
+    assert M.emis_full.dtype == np.float32
+    assert M.get_emis_vol('Hbeta_copy') == M.get_emis_vol(lab)
+
+def test_selective_read(model):
+    M = pc.CloudyModel(MODEL, emis_labels=['O  3 5006.84A', 'N__2_658345A'], ions={'O': 3})
+    assert list(M.emis_labels) == [model.Hbeta_label, 'N__2_658345A', 'O__3_500684A']
+    assert M.Hbeta_label == model.Hbeta_label
+    for label in M.emis_labels:
+        assert M.get_emis_vol(label) == model.get_emis_vol(label)
+    assert M.ionic_names['O'] == model.ionic_names['O'][:3]
+    assert np.array_equal(M.ionic_full['O'], model.ionic_full['O'][:3])
+    assert M.get_ab_ion_vol('O', 2) == model.get_ab_ion_vol('O', 2)
+    assert np.array_equal(M.ionic_full['Fe'], model.ionic_full['Fe'])
+
+def test_r_range_views():
+    M = pc.CloudyModel(MODEL)
+    M.r_out_cut = M.radius_full[50]
+    mask = (M.depth_full <= M.depth_out_cut) & (M.depth_full >= M.depth_in_cut)
+    assert np.array_equal(M.r_range, mask)
+    assert M.n_zones == mask.sum()
+    assert np.array_equal(M.te, M.te_full[mask])
+    assert np.shares_memory(M.te, M.te_full)
+    assert not M.te.flags.writeable
+    assert np.array_equal(M.dvff, (M.dv_full * M.ff_full)[mask])
+    assert np.array_equal(M.get_emis(0), M.emis_full[0][mask])
+    # the cached quantities are updated when the cut changes
+    M.r_out_cut = M.r_out
+    assert M.n_zones == M.n_zones_full
+    assert np.array_equal(M.dvff, M.dv_full * M.ff_full)
+
+def test_single_zone_range():
+    M = pc.CloudyModel(MODEL)
+    M.depth_in_cut = M.depth_full[-1]
+    assert M.n_zones == 1
+    assert M.te == M.te_full[-1]
+    assert np.isclose(M.get_emis_vol(0), M.vol_integ(M.get_emis(0)), rtol=1e-12)
+    assert np.isclose(M.get_emis_vol(0), M.get_emis_vol_all()[0], rtol=1e-12)
+
+def test_integ_all(model):
+    assert np.allclose(model.get_emis_vol_all(), [model.get_emis_vol(i) for i in range(model.n_emis)], rtol=1e-12)
+    assert np.allclose(model.get_emis_rad_all(), [model.get_emis_rad(i) for i in range(model.n_emis)], rtol=1e-12)
+    assert np.allclose(model.get_T0_emis_all(), [model.get_T0_emis(i) for i in range(model.n_emis)], rtol=1e-12)
+    assert np.allclose(model.get_t2_emis_all(), [model.get_t2_emis(i) for i in range(model.n_emis)], rtol=1e-9)
+    ab_ion = model.get_ab_ion_all('vol', 'ne')
+    t_ion = model.get_T0_ion_all('rad', 'H')
+    for elem in model.liste_elem:
+        assert np.allclose(ab_ion[elem], [model.get_ab_ion_vol_ne(elem, i) for i in range(model.n_ions[elem])],
+                           rtol=1e-12, atol=1e-15)
+        assert np.allclose(t_ion[elem], [model.get_T0_ion_rad(elem, i) for i in range(model.n_ions[elem])],
+                           rtol=1e-12, equal_nan=True)
+
+def test_cuts():
+    M = pc.CloudyModel(MODEL)
+    M.r_in_cut = M.radius_full[5]
+    depth_out_cuts = M.depth_full[[20, 50, 143]]
+    emis_vol = M.get_emis_vol_cuts(depth_out_cuts)
+    T0_emis = M.get_T0_emis_cuts(depth_out_cuts)
+    assert emis_vol.shape == (M.n_emis, 3)
+    for i, depth_out_cut in enumerate(depth_out_cuts):
+        M.depth_out_cut = depth_out_cut
+        assert np.allclose(emis_vol[:, i], M.get_emis_vol_all(), rtol=1e-12)
+        assert np.allclose(T0_emis[:, i], M.get_T0_emis_all(), rtol=1e-12, equal_nan=True)
+        assert np.isclose(M.get_emis_vol(M.Hbeta_label), M.vol_integ(M.get_emis(M.Hbeta_label)), rtol=1e-12)
+        assert np.isclose(M.H_mass, M.vol_integ(M.nH) * pc.CST.HMASS / pc.CST.SUN_MASS, rtol=1e-12)
+
+def test_cumul_cache():
+    M = pc.CloudyModel(MODEL)
+    M.r_in_cut = M.radius_full[5]
+    # the integrals on r_range do not use the cumulative sums
+    M.get_emis_vol_all()
+    M.get_ab_ion_all('vol', 'H')
+    for label in M.emis_labels:
+        M.get_emis_vol(label)
+    assert len(M._cumul_cache) == 0
+    emis_vol = M.get_emis_vol_cuts(M.depth_full[[20, 80]])
+    cumul = M._cumul_cache[('emis', 0)][2]
+    assert np.array_equal(M.get_emis_vol_cuts(M.depth_full[[20, 80]]), emis_vol)
+    assert M._cumul_cache[('emis', 0)][2] is cumul
+    # the cumulative sums are computed again when depth_in_cut or a source array changes
+    M.te_full = M.te_full * 2.
+    M.get_T0_emis_cuts(M.depth_full[[20, 80]])
+    M.r_in_cut = M.radius_full[10]
+    M.get_emis_vol_cuts(M.depth_full[[20, 80]])
+    assert M._cumul_cache[('emis', 0)][2] is not cumul
+    M.reset_cumul_cache()
+    assert len(M._cumul_cache) == 0
+
+def test_cuts_precision():
+    M = pc.CloudyModel(MODEL)
+    M.emis_full = M.emis_full.copy()
+    M.emis_full[0] *= np.logspace(0, -25, M.n_zones_full)
+    M.r_in_cut = M.radius_full[120]
+    emis_vol = M.get_emis_vol_cuts(M.depth_full[[130, -1]])
+    assert np.isclose(emis_vol[0, 1], M.vol_integ(M.get_emis(0)), rtol=1e-12)
+    assert np.isclose(M.get_emis_vol_all()[0], M.vol_integ(M.get_emis(0)), rtol=1e-12)
+    assert np.isclose(M.get_emis_vol(0), M.vol_integ(M.get_emis(0)), rtol=1e-12)
+
+@pytest.mark.parametrize('kind', ['H_mass', 'Hbeta', 'ColDens', 'r_out', 'depth_out'])
+def test_cuts_table(model, kind):
+    x_full = {'H_mass': model.H_mass_full, 'Hbeta': model.Hbeta_full, 'r_out': model.radius_full,
+              'depth_out': model.depth_full,
+              'ColDens': np.cumsum(model.dr_full * model.nH_full * model.ff_full)}[kind]
+    values = x_full[[20, 80]] * 1.0001
+    table = model.get_cuts_table(kind, values)
+    for i, value in enumerate(values):
+        M = pc.CloudyModel(MODEL)
+        setattr(M, kind + '_cut', value)
+        assert table['n_zones'][i] == M.n_zones
+        for prop in ('H_mass', 'Hp_mass', 'ColDens', 'Hbeta', 'T0', 'log_U_mean', 'log_U_mean_ne'):
+            assert np.isclose(table[prop][i], getattr(M, prop), rtol=1e-12)
+        for label in M.emis_labels:
+            assert np.isclose(table[label][i], M.get_emis_vol(label), rtol=1e-12)
+
+def test_quiet_divide(model):
+    import warnings
+    from pyCloudy.utils.misc import quiet_divide
+    err = np.geterr()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        res = quiet_divide(np.array([1., 0.]), np.array([0., 0.]))
+        assert np.isinf(res[0]) and np.isnan(res[1])
+        model.get_T0_emis_all()
+    assert np.geterr() == err
+
+def test_load_models_parallel():
+    from concurrent.futures import ThreadPoolExecutor
+    mod_list = [MODEL, MODEL + '.out', MODEL + '_missing']
+    ref = pc.load_models(mod_list=mod_list, read_grains=False)
+    assert len(ref) == 2
+    with ThreadPoolExecutor(2) as executor:
+        res_thread = pc.load_models(mod_list=mod_list, executor=executor)
+    for models in (pc.load_models(mod_list=mod_list, n_procs=2), res_thread):
+        assert [M.model_name for M in models] == [M.model_name for M in ref]
+        for M, M_ref in zip(models, ref):
+            assert np.array_equal(M.emis_full, M_ref.emis_full)
+            assert M.get_T0_emis(M.Hbeta_label) == M_ref.get_T0_emis(M_ref.Hbeta_label)
+
+def test_iter_models():
+    mod_list = [MODEL, MODEL + '_missing', MODEL + '.out', MODEL]
+    ref = pc.load_models(mod_list=mod_list)
+    assert len(ref) == 3
+    for kwargs in ({}, {'n_procs': 2, 'prefetch': 1}):
+        models = pc.iter_models(mod_list=mod_list, **kwargs)
+        for M_ref in ref:
+            M = next(models)
+            assert np.array_equal(M.emis_full, M_ref.emis_full)
+        with pytest.raises(StopIteration):
+            next(models)
+    # stopping the iteration before the end
+    for M in pc.iter_models(mod_list=mod_list, n_procs=2):
+        break
+    assert M.model_name == MODEL
+
+def test_model_set(model, tmp_path):
+    M2 = pc.CloudyModel(MODEL, emis_labels=['O  3 5006.84A'])
+    MS = pc.ModelSet([model, M2])
+    assert len(MS) == 2
+    assert np.allclose(MS['Hbeta'], model.Hbeta, rtol=1e-12)
+    assert MS['T0'][0] == model.T0
+    assert MS['abund_O'][0] == model.abund['O']
+    label = 'N__2_658345A'
+    assert MS[label][0] == model.get_emis_vol(label)
+    assert np.isnan(MS[label][1])
+    assert np.allclose(MS.get_ratio('O__3_500684A', model.Hbeta_label),
+                       model.get_emis_vol('O__3_500684A') / model.Hbeta, rtol=1e-12)
+    assert np.isclose(MS['T0_' + model.Hbeta_label][1], model.get_T0_emis(model.Hbeta_label), rtol=1e-12)
+    sub = MS[np.isfinite(MS[label])]
+    assert len(sub) == 1 and sub[label][0] == MS[label][0]
+    assert len(MS[0]) == 1 and len(MS[-1]) == 1 and MS[-1].model_names[0] == MS.model_names[1]
+    MS.save(str(tmp_path / 'set.npz'))
+    MS2 = pc.ModelSet.load(str(tmp_path / 'set.npz'))
+    assert list(MS2.model_names) == list(MS.model_names)
+    assert MS2.keys() == MS.keys()
+    for key in MS.keys():
+        assert np.array_equal(MS2[key], MS[key], equal_nan=True)
+
+def test_zone_set(model, tmp_path):
+    M2 = pc.CloudyModel(MODEL, emis_labels=['O  3 5006.84A'])
+    labels = ['O__3_500684A', 'N__2_658345A']
+    ZS = pc.ZoneSet([model, M2], emis_labels=labels)
+    assert len(ZS) == 2
+    assert list(ZS.n_zones) == [model.n_zones_full, M2.n_zones_full]
+    assert np.array_equal(ZS.get_model('te', 1), M2.te_full)
+    assert np.allclose(ZS.vol_integ('nH'), [model.vol_integ(model.nH_full), M2.vol_integ(M2.nH_full)], rtol=1e-12)
+    assert np.isclose(ZS.vol_mean('te', ZS['ne'] * ZS['nH'])[0], model.T0, rtol=1e-12)
+    O3 = ZS.get_emis_vol('O__3_500684A')
+    assert np.isclose(O3[0], model.get_emis_vol('O__3_500684A'), rtol=1e-12)
+    assert np.isnan(ZS.get_emis_vol()[1, 1])
+    ZS.save(str(tmp_path / 'zones'))
+    ZS2 = pc.ZoneSet.load(str(tmp_path / 'zones'))
+    assert np.array_equal(ZS2.offsets, ZS.offsets)
+    assert np.array_equal(ZS2.emis, ZS.emis, equal_nan=True)
+    assert np.array_equal(ZS2['te'], ZS['te'])
+    ZS32 = pc.ZoneSet([model], dtype=np.float32)
+    assert ZS32['te'].dtype == np.float32 and ZS32['dv'].dtype == np.float64
+    assert np.allclose(ZS32.vol_integ('nH'), ZS.vol_integ('nH')[0], rtol=1e-6)
+    # the labels are defined by the second model of the batch
+    M3 = pc.CloudyModel(MODEL, read_emis=False)
+    ZS3 = pc.ZoneSet([M3, model])
+    assert ZS3.emis.shape[1] == ZS3.offsets[-1]
+    Hb = ZS3.get_emis_vol(model.Hbeta_label)
+    assert np.isnan(Hb[0]) and np.isclose(Hb[1], model.Hbeta, rtol=1e-12)
+
+def test_grid_watcher(tmp_path):
+    import glob
+    import shutil
+    def copy_model(name):
+        for file_ in glob.glob(MODEL + '.*'):
+            shutil.copy(file_, str(tmp_path / (name + os.path.splitext(file_)[1])))
+    prefix = str(tmp_path / 'grid_')
+    copy_model('grid_a')
+    with open(prefix + 'a.out') as f:
+        out = f.read()
+    with open(prefix + 'a.out', 'w') as f:
+        f.write(out[:len(out) // 2])
+    # .npz is added to the file name
+    store = str(tmp_path / 'grid')
+    GW = pc.GridWatcher(prefix, file_=store)
+    assert GW.update() == 0
+    copy_model('grid_a')
+    copy_model('grid_b')
+    assert GW.update() == 2
+    assert sorted(GW.store.model_names) == [prefix + 'a', prefix + 'b']
+    assert GW.update() == 0
+    assert sorted(glob.glob(store + '.*')) == [store + '.npz', store + '.npz.json']
+    # a model computed again replaces the old one
+    os.utime(prefix + 'a.out', ns=(0, 10**9))
+    assert GW.update() == 1
+    assert len(GW.store) == 2
+    GW2 = pc.GridWatcher(prefix, file_=store)
+    assert len(GW2.store) == 2 and GW2.update() == 0
+    MS = pc.ModelSet()
+    GW2 = pc.GridWatcher(prefix, store=MS, file_=store)
+    assert GW2.store is MS and len(MS) == 2
+    with pytest.raises(Exception):
+        pc.GridWatcher(prefix, store=MS, file_=store)
+    ZS = pc.ZoneSet(emis_labels=['H__1_486133A'])
+    GW3 = pc.GridWatcher(prefix, store=ZS)
+    GW3.watch(delay=0., n_models=2)
+    assert len(ZS) == 2 and ZS.offsets[-1] == 2 * ZS.n_zones[0]
+
+def test_cont_units(model):
+    conts = ['incid', 'ntrans', 'diffout']
+    units = ['es', 'esA', 'Jy', 'Q', 'phsmuc']
+    res = model.get_cont_y(cont=conts, unit=units)
+    assert res.shape == (3, 5, len(model.get_cont_x()))
+    for i, cont in enumerate(conts):
+        assert np.array_equal(model.get_cont_y(cont=cont, unit=units), res[i])
+        for j, unit in enumerate(units):
+            assert np.array_equal(model.get_cont_y(cont=cont, unit=unit), res[i, j])
+    assert np.array_equal(model.get_cont_y(cont=conts, unit='esA'), res[:, 1])
+    esA = model.get_cont_y('incid', 'es') / model.get_cont_x('Ang')
+    assert np.allclose(res[0, 1], esA, rtol=1e-14)
+    x = model.get_cont_x('Ang')
+    assert np.array_equal(model.get_cont_x(['Ryd', 'Ang'])[1], x)
+    with pytest.raises(ValueError):
+        x[0] = 0.
+    assert model.get_cont_y(cont='NOT_A_CONT') is None
+
+def test_Q_above(model):
+    Es = np.array([11.26, 13.6, 24.6, 54.4])
+    Q = model.get_Q_above(Es)
+    assert Q.shape == Es.shape
+    ref = [model.get_interp_cont(x_value=E, x_unit='eV', unit='Q') for E in Es]
+    assert np.allclose(Q, ref, rtol=1e-12)
+    assert np.all(np.diff(Q) < 0)
+    assert np.isclose(model.get_Q_above(pc.CST.RYD_ANG, unit='Ang'), model.get_Q_above(pc.CST.RYD_EV), rtol=1e-5)
+    Q_ntrans = model.get_Q_above(Es, cont='ntrans')
+    assert np.array_equal(model.get_cont_y(cont='ntrans', unit='Q'), model.get_cont_y(cont=['ntrans'], unit='Q')[0])
+    assert np.all(Q_ntrans <= Q)
+
+def test_EWs(model):
+    lam = model.get_cont_x('Ang')
+    cont = model.get_cont_y('ntrans', 'esA')
+    labels = [model.Hbeta_label, 'O__3_500684A', 'N__2_658345A', 'NOT_A_LINE']
+    lam0s = np.array([4861., 5006.84, 6583.45, 5000.])
+    EWs = model.get_EWs(labels, lam0s)
+    for label, lam0, EW in zip(labels[:-1], lam0s, EWs):
+        I_low = np.min(cont[(lam < lam0) & (lam > lam0 - 300)])
+        I_high = np.min(cont[(lam > lam0) & (lam < lam0 + 300)])
+        assert np.isclose(EW, -model.get_emis_vol(label) / np.mean((I_low, I_high)), rtol=1e-12)
+    assert np.isnan(EWs[-1])
+    assert np.isclose(model.get_EWs([model.Hbeta_label], 4861, 4560, 5160)[0], model.get_Hb_EW(), rtol=1e-12)
+    assert np.isnan(model.get_EWs([model.Hbeta_label], 4861, 4860.9, 4861.1)[0])
+    with pytest.raises(Exception, match='No emissivities'):
+        pc.CloudyModel(MODEL, read_emis=False).get_EWs([model.Hbeta_label], 4861.)
+
+def test_filter_bank(model, tmp_path):
+    bands = [(5000., 6000.), (912., 2000.), (4861., 4861.5), (100., 1e5)]
+    FB = pc.FilterBank()
+    for i, (lam_min, lam_max) in enumerate(bands):
+        FB.add_top_hat('B{0}'.format(i), lam_min, lam_max)
+    lam = np.linspace(4000., 7000., 31)
+    np.savetxt(str(tmp_path / 'filter.dat'), np.column_stack((lam, np.exp(-((lam - 5500.) / 500.) ** 2))))
+    FB.add_file('G', str(tmp_path / 'filter.dat'))
+    res = model.get_band_integ(FB, cont=['diffout', 'incid'])
+    assert res.shape == (2, 5)
+    x = model.get_cont_x('Ang')
+    for i, cont in enumerate(['diffout', 'incid']):
+        y = model.get_cont_y(cont, 'esA')
+        cumul = np.concatenate(([0.], np.cumsum(np.diff(x[::-1]) * (y[::-1][1:] + y[::-1][:-1]) / 2.)))
+        for j, (lam_min, lam_max) in enumerate(bands):
+            ref = np.diff(np.interp([lam_min, lam_max], x[::-1], cumul))[0]
+            assert np.isclose(res[i, j], ref, rtol=1e-10)
+        T = np.interp(x, lam, np.exp(-((lam - 5500.) / 500.) ** 2), left=0., right=0.)
+        assert np.isclose(res[i, 4], abs(np.trapz(T * y, x)), rtol=1e-10)
+    assert np.isclose(res[0, 0], model.get_integ_spec('diffout', 5000, 6000), rtol=1e-2)
+    assert np.allclose(model.get_band_integ(FB, 'diffout'), res[0], rtol=1e-14)
+    assert np.isclose(model.get_band_integ(FB, 'diffout', mean=True)[0], res[0, 0] / 1000., rtol=1e-10)
+    FB.add_top_hat('out', 1e20, 2e20)
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        assert np.isnan(model.get_band_integ(FB, 'diffout', mean=True)[-1])
+
+def test_continuum_cube(model, tmp_path):
+    edges = np.linspace(3000., 9000., 61)
+    mod_list = [MODEL, MODEL + '_missing']
+    CC = pc.ContinuumCube.build(str(tmp_path / 'cube'), edges, mod_list=mod_list, cont='diffout')
+    assert CC.data.shape == (2, 60)
+    assert np.all(np.isnan(CC[1]))
+    FB = pc.FilterBank()
+    for i in range(60):
+        FB.add_top_hat(str(i), edges[i], edges[i + 1])
+    assert np.allclose(CC.get(MODEL), model.get_band_integ(FB, 'diffout') / np.diff(edges), rtol=1e-10)
+    assert np.isclose(np.sum(CC[0] * np.diff(edges)), model.get_integ_spec('diffout', 3000., 9000.), rtol=1e-2)
+    CC2 = pc.ContinuumCube.build(str(tmp_path / 'cube2'), edges, mod_list=[MODEL] * 3, cont='diffout', n_procs=2)
+    CC2 = pc.ContinuumCube(str(tmp_path / 'cube2'))
+    assert isinstance(CC2.data, np.memmap)
+    assert np.array_equal(CC2[:], np.tile(CC[0], (3, 1)))
+    assert np.allclose(CC2.x, (edges[1:] + edges[:-1]) / 2.)
+    # a failed build leaves no file
+    with pytest.raises(Exception):
+        pc.ContinuumCube.build(str(tmp_path / 'bad'), edges[::-1], mod_list=[MODEL])
+    assert not [f for f in os.listdir(str(tmp_path)) if f.startswith('bad')]
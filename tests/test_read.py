@@ -0,0 +1,142 @@
+import os
+import numpy as np
+import pytest
+import pyCloudy as pc
+from pyCloudy.utils.misc import read_cloudy_tab
+
+MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'M17')
+
+@pytest.mark.parametrize('ext, kwargs', [('rad', {}),
+                                         ('phy', {}),
+                                         ('ovr', {}),
+                                         ('opd', {}),
+                                         ('ele_O', {}),
+                                         ('ele_Fe', {}),
+                                         ('emis', {'case_sensitive': 'upper'}),
+                                         ('cont', {'usecols': (0, 1, 2, 3, 4, 5, 6)}),
+                                         ('heat', {'names': 'depth, temp, heat, cool',
+                                                   'usecols': (0, 1, 2, 3), 'comments': '#'})])
+def test_read_cloudy_tab(ext, kwargs):
+    kw = {'delimiter': '\t', 'comments': ';', 'names': True}
+    kw.update(kwargs)
+    ref = np.genfromtxt(MODEL + '.' + ext, **kw)
+    res = read_cloudy_tab(MODEL + '.' + ext, **kw)
+    assert res.dtype.names == ref.dtype.names
+    assert res.shape == ref.shape
+    for name in ref.dtype.names:
+        assert np.array_equal(res[name], ref[name], equal_nan=True)
+
+def test_read_malformed(tmp_path):
+    with open(MODEL + '.rad') as f:
+        lines = f.readlines()
+    lines[3] = lines[3].replace('\t', '\t\t', 1)
+    lines[5] = '\t'.join(lines[5].split('\t')[:-1]) + '\t\n'
+    file_ = tmp_path / 'M17.rad'
+    file_.write_text(''.join(lines))
+    with pytest.raises(ValueError):
+        read_cloudy_tab(str(file_))
+    M = pc.CloudyModel(MODEL, read_all_ext=False)
+    M.model_name = str(tmp_path / 'M17')
+    res = M.read_outputs('rad', invalid_raise=False)
+    ref = np.genfromtxt(str(file_), delimiter='\t', comments=';', names=True, invalid_raise=False)
+    assert np.array_equal(res['depth'], ref['depth'], equal_nan=True)
+
+def test_cache(tmp_path):
+    import glob, shutil
+    for file_ in glob.glob(MODEL + '.*'):
+        shutil.copy(file_, str(tmp_path))
+    model_name = str(tmp_path / 'M17')
+    ref = pc.CloudyModel(MODEL)
+    M1 = pc.CloudyModel(model_name, use_cache=True)
+    assert os.path.exists(model_name + '.cache/manifest.json')
+    M2 = pc.CloudyModel(model_name, use_cache=True)
+    for M in (M1, M2):
+        assert M.out == ref.out
+        assert M.Teff == ref.Teff
+        assert M.cloudy_version_major == ref.cloudy_version_major
+        assert np.array_equal(M.Q, ref.Q)
+        assert M.abund == ref.abund
+        assert np.array_equal(M.emis_full, ref.emis_full)
+        assert np.array_equal(M.ionic_full['O'], ref.ionic_full['O'])
+        assert np.array_equal(M.abunds_full, ref.abunds_full)
+        assert M.get_Hb_EW() == ref.get_Hb_EW()
+    # A new output is added without rewriting the others
+    emis_stat = os.stat(model_name + '.cache/ext_emis.npy').st_mtime_ns
+    M_heat = pc.CloudyModel(model_name, use_cache=True, lazy=True, read_heatcool=True)
+    assert np.array_equal(M_heat.heat_full, pc.CloudyModel(MODEL, read_heatcool=True).heat_full)
+    assert os.path.exists(model_name + '.cache/ext_heat.npy')
+    assert os.stat(model_name + '.cache/ext_emis.npy').st_mtime_ns == emis_stat
+    assert np.array_equal(pc.CloudyModel(model_name, use_cache=True, read_heatcool=True).heat_full, M_heat.heat_full)
+    # A modified file is read again
+    with open(model_name + '.phy') as f:
+        lines = f.readlines()
+    lines[1] = lines[1].replace('5.4871e+03', '6.0000e+03')
+    with open(model_name + '.phy', 'w') as f:
+        f.writelines(lines)
+    M3 = pc.CloudyModel(model_name, use_cache=True)
+    assert M3.te_full[0] == 6000.
+    assert np.array_equal(M3.te_full[1:], ref.te_full[1:])
+
+def test_mmap(tmp_path):
+    import glob, shutil
+    for file_ in glob.glob(MODEL + '.*'):
+        shutil.copy(file_, str(tmp_path))
+    model_name = str(tmp_path / 'M17')
+    ref = pc.CloudyModel(MODEL)
+    M1 = pc.CloudyModel(model_name, use_mmap=True)
+    assert os.path.exists(model_name + '.cache/mmap_emis.npy')
+    M2 = pc.CloudyModel(model_name, use_mmap=True)
+    for M in (M1, M2):
+        assert isinstance(M.emis_full, np.memmap)
+        assert isinstance(M.ionic_full['O'], np.memmap)
+        assert np.array_equal(M.emis_full, ref.emis_full)
+        assert list(M.emis_labels) == list(ref.emis_labels)
+        assert M.get_emis_vol(ref.Hbeta_label) == ref.get_emis_vol(ref.Hbeta_label)
+        assert M.ionic_names['O'] == ref.ionic_names['O']
+        assert np.array_equal(M.ionic_full['O'], ref.ionic_full['O'])
+        assert np.array_equal(M.get_cont_y(), ref.get_cont_y())
+    # A modified file is converted again
+    with open(model_name + '.ele_O') as f:
+        lines = f.readlines()
+    lines[1] = lines[1].replace('1.26e-06', '2.00e-06', 1)
+    with open(model_name + '.ele_O', 'w') as f:
+        f.writelines(lines)
+    M3 = pc.CloudyModel(model_name, use_mmap=True)
+    assert M3.ionic_full['O'][0, 0] == 2e-6
+    assert np.array_equal(M3.ionic_full['O'][:, 1:], ref.ionic_full['O'][:, 1:])
+    assert np.array_equal(M3.emis_full, ref.emis_full)
+    # with use_cache, the converted arrays are stored instead of the parsed tables, in the same manifest
+    M4 = pc.CloudyModel(model_name, use_mmap=True, use_cache=True)
+    assert isinstance(M4.emis_full, np.memmap)
+    assert not os.path.exists(model_name + '.cache/ext_emis.npy')
+    assert os.path.exists(model_name + '.cache/ext_phy.npy')
+    M5 = pc.CloudyModel(model_name, use_mmap=True, use_cache=True)
+    assert M5.out == ref.out
+    assert np.array_equal(M5.te_full, ref.te_full)
+    assert isinstance(M5.ionic_full['O'], np.memmap)
+
+def test_lazy():
+    ref = pc.CloudyModel(MODEL)
+    M = pc.CloudyModel(MODEL, lazy=True)
+    assert 'te_full' not in M.__dict__
+    assert np.array_equal(M.te, ref.te)
+    assert sorted(dict.keys(M._res)) == ['phy', 'rad']
+    assert np.array_equal(M.get_ionic('O', 2), ref.get_ionic('O', 2))
+    assert 'ele_Fe' not in dict.keys(M._res)
+    assert M.get_emis_vol(ref.Hbeta_label) == ref.get_emis_vol(ref.Hbeta_label)
+    assert M.liste_elem == ref.liste_elem
+    assert list(M._res.keys()) == list(ref._res.keys())
+    assert np.array_equal(M.get_cont_y(), ref.get_cont_y())
+    M.H_mass_cut = 0.5 * M.H_mass_full[-1]
+    ref.H_mass_cut = 0.5 * ref.H_mass_full[-1]
+    assert M.n_zones == ref.n_zones
+
+def test_read_out_until():
+    ref = pc.CloudyModel(MODEL, read_all_ext=False)
+    M = pc.CloudyModel(MODEL, read_all_ext=False, read_out_until='###First')
+    assert M.cloudy_version == ref.cloudy_version
+    assert M.Teff == ref.Teff
+    assert M.abund == ref.abund
+    assert np.array_equal(M.Q, ref.Q)
+    assert M.out['Cloudy ends'] == ''
+    assert M.warnings == []